@@ -0,0 +1,227 @@
+"""end to end benchmark of a real BlocClient against local stand-ins of
+bloc-server(fake_bloc_server) and rabbitMQ(fake_rabbitmq).
+For each function type and payload size, publishes run msgs and reports
+runs per second, p50/p99 dispatch-to-finish latency and where the time goes:
+    queue: dispatched -> function run record fetched
+    start: record fetched -> run start reported(includes waiting for a free worker)
+    ipt:   run start -> last ipt downloaded
+    run:   last ipt downloaded -> run finished reported(run, persist opt...)
+
+    python -m benchmarks.e2e_bench [--runs 50] [--concurrency 4] [--items 10,10000,200000]
+"""
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import statistics
+from multiprocessing import Event, Process
+from typing import Dict, List
+
+import httpx
+
+from bloc_client import *
+from benchmarks.fake_rabbitmq import FakeRabbitMQ
+from benchmarks.fake_bloc_server import serve
+
+ClientName = "bench"
+GroupName = "bench"
+Phases = [
+    ("queue", "dispatched", "record_fetched"),
+    ("start", "record_fetched", "started"),
+    ("ipt", "started", "ipt_downloaded"),
+    ("run", "ipt_downloaded", "finished"),
+]
+
+
+class SumNumbers(FunctionInterface):
+    def ipt_config(self) -> List[FunctionIpt]:
+        return [
+            FunctionIpt(
+                key="numbers",
+                display="int numbers",
+                must=True,
+                components=[
+                    IptComponent(
+                        value_type=ValueType.intValueType,
+                        formcontrol_type=FormControlType.FormControlTypeInput,
+                        hint="int numbers",
+                        allow_multi=True,
+                    )
+                ]
+            )
+        ]
+
+    def opt_config(self) -> List[FunctionOpt]:
+        return [
+            FunctionOpt(
+                key="sum",
+                description="sum of numbers",
+                value_type=ValueType.intValueType,
+                is_array=False)
+        ]
+
+    def all_progress_milestones(self) -> List[str]:
+        return ["sum", "finished"]
+
+    def run(self, ipts: List[FunctionIpt], queue: FunctionRunMsgQueue):
+        queue.report_log(LogLevel.info, "start")
+        queue.report_high_readable_progress(progress_milestone_index=0)
+        result = sum(ipts[0].components[0].value)
+        queue.report_high_readable_progress(progress_milestone_index=1)
+        queue.report_function_run_finished_opt(
+            FunctionRunOpt(optKey_map_data={"sum": result}))
+
+
+class AsyncSumNumbers(SumNumbers):
+    async def run(self, ipts: List[FunctionIpt], queue: FunctionRunMsgQueue):
+        SumNumbers.run(self, ipts, queue)
+
+
+FunctionTypes = {
+    "process": (SumNumbers, ExecutionPolicy.process),
+    "thread": (SumNumbers, ExecutionPolicy.thread),
+    "async": (AsyncSumNumbers, ExecutionPolicy.process),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def _wait_finished(
+    http: httpx.AsyncClient, server: str,
+    function_run_record_ids: List[str], timeout: float,
+) -> Dict[str, dict]:
+    deadline = time.time() + timeout
+    while True:
+        resp = await http.get(f"{server}/bench/stats")
+        records = resp.json()["data"]["records"]
+        if all("finished" in records[i]["phases"] for i in function_run_record_ids):
+            return records
+        if time.time() > deadline:
+            raise Exception("runs not finished in time")
+        await asyncio.sleep(0.05)
+
+
+async def _run_case(
+    http: httpx.AsyncClient, server: str, rabbit: FakeRabbitMQ,
+    function_type: str, item_count: int, runs: int,
+):
+    data = json.dumps(list(range(item_count)))
+    function_run_record_ids = []
+    for _ in range(runs):
+        resp = await http.post(f"{server}/bench/new_run", json={
+            "function_id": f"{GroupName}.{function_type}",
+            "ipt": [[data]]})
+        function_run_record_ids.append(resp.json()["data"])
+
+    dispatched = {}
+    for i in function_run_record_ids:
+        dispatched[i] = time.time()
+        rabbit.publish(json.dumps(
+            {"FunctionRunRecordID": i, "ClientName": ClientName}).encode())
+    records = await _wait_finished(
+        http, server, function_run_record_ids, timeout=60 + runs)
+
+    latencies = []
+    phase_costs = {name: [] for name, _, _ in Phases}
+    failed = 0
+    for i in function_run_record_ids:
+        phases = dict(records[i]["phases"], dispatched=dispatched[i])
+        failed += not records[i]["suc"]
+        latencies.append(phases["finished"] - phases["dispatched"])
+        for name, begin, end in Phases:
+            if begin in phases and end in phases:
+                phase_costs[name].append(phases[end] - phases[begin])
+    cost = max(dispatched[i] + latencies[index]
+               for index, i in enumerate(function_run_record_ids)) - min(dispatched.values())
+
+    print(
+        f"{function_type:<9}{item_count:>9}{runs / cost:>10.1f}"
+        f"{_percentile(latencies, 50) * 1000:>10.1f}{_percentile(latencies, 99) * 1000:>10.1f}"
+        + "".join(
+            f"{statistics.median(phase_costs[name]) * 1000 if phase_costs[name] else 0:>9.1f}"
+            for name, _, _ in Phases)
+        + f"{failed:>8}")
+
+
+async def _bench(
+    client: BlocClient, rabbit: FakeRabbitMQ, server: str,
+    function_types: List[str], item_counts: List[int], runs: int,
+):
+    client_task = asyncio.ensure_future(client.run())
+    while not client.id_map_function:
+        if client_task.done():
+            client_task.result()
+        await asyncio.sleep(0.05)
+
+    print(
+        f"{'function':<9}{'items':>9}{'runs/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        + "".join(f"{name + ' ms':>9}" for name, _, _ in Phases)
+        + f"{'failed':>8}")
+    try:
+        async with httpx.AsyncClient(timeout=60) as http:
+            for function_type in function_types:
+                for item_count in item_counts:
+                    await _run_case(
+                        http, server, rabbit, function_type, item_count, runs)
+    finally:
+        rabbit.close()
+        client_task.cancel()
+        try:
+            await client_task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=50, help="runs per case")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--items", default="10,10000,200000", help="int ipt sizes")
+    parser.add_argument("--functions", default=",".join(FunctionTypes))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    port = _free_port()
+    ready = Event()
+    server_process = Process(target=serve, args=(port, ready), daemon=True)
+    server_process.start()
+    ready.wait()
+
+    function_types = args.functions.split(",")
+    client = BlocClient.new_client(ClientName)
+    group = client.register_function_group(GroupName)
+    for function_type in function_types:
+        func, execution_policy = FunctionTypes[function_type]
+        group.add_function(
+            function_type, f"sum numbers, {function_type}",
+            func(), execution_policy=execution_policy)
+    rabbit = FakeRabbitMQ()
+    config = client.get_config_builder(
+    ).set_server(
+        "127.0.0.1", port,
+    ).set_concurrency(args.concurrency)
+    # instead of build_up, which connects to a real rabbitMQ
+    config.rabbit = rabbit
+
+    try:
+        asyncio.run(_bench(
+            client, rabbit, f"http://127.0.0.1:{port}",
+            function_types, [int(i) for i in args.items.split(",")], args.runs))
+    finally:
+        server_process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""local stand-in of bloc-server, implements the client api BlocClient uses.
+Keeps everything in memory and records when each function run reaches each
+phase, which the benchmark reads back from /bench/stats.
+
+    python -m benchmarks.fake_bloc_server [port]
+"""
+import sys
+import json
+import time
+import base64
+import threading
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+ClientApiPrefix = "/api/v1/client/"
+BenchApiPrefix = "/bench/"
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects: Dict[str, bytes] = {}
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.request_counts: Dict[str, int] = {}
+        self.log_lines = 0
+        self.next_id = 0
+
+    def new_id(self, prefix: str) -> str:
+        with self.lock:
+            self.next_id += 1
+            return f"{prefix}{self.next_id}"
+
+    def mark(self, function_run_record_id: str, phase: str):
+        record = self.records.get(function_run_record_id)
+        if record is not None:
+            record["phases"][phase] = time.time()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    state: _State = None
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    # or small replies wait for the client's delayed ack, which the bench
+    # would measure instead of the client
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, data: Any, status_code: int=200, status_msg: str=""):
+        body = json.dumps({
+            "status_code": status_code,
+            "status_msg": status_msg,
+            "data": data,
+            "trace_id": ""}).encode()
+        # in one write, wfile is unbuffered
+        self.wfile.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n" % len(body) + body)
+
+    def _body(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _route(self, method: str):
+        path = urlparse(self.path).path
+        body = self._body() if method == "POST" else None
+        if path.startswith(ClientApiPrefix):
+            api, _, arg = path[len(ClientApiPrefix):].partition("/")
+            handler = getattr(self, f"_client_{api}", None)
+        elif path.startswith(BenchApiPrefix):
+            api, _, arg = path[len(BenchApiPrefix):].partition("/")
+            handler = getattr(self, f"_bench_{api}", None)
+        else:
+            handler = None
+        if handler is None:
+            self._reply(None, 404, f"no api {path}")
+            return
+        with self.state.lock:
+            self.state.request_counts[api] = self.state.request_counts.get(api, 0) + 1
+        handler(arg, body)
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    # client api
+    def _client_register_functions(self, _, body):
+        groupName_map_functions = {}
+        for group_name, functions in (body.get("groupName_map_functions") or {}).items():
+            groupName_map_functions[group_name] = [
+                {"name": i["name"], "id": f"{group_name}.{i['name']}"}
+                for i in functions]
+        self._reply({"groupName_map_functions": groupName_map_functions})
+
+    def _client_get_function_run_record_by_id(self, function_run_record_id, _):
+        record = self.state.records.get(function_run_record_id)
+        if record is None:
+            self._reply(None, 404, "function run record not found")
+            return
+        self.state.mark(function_run_record_id, "record_fetched")
+        self._reply({
+            "id": function_run_record_id,
+            "flow_id": "bench_flow",
+            "function_id": record["function_id"],
+            "flow_function_id": "bench_flow_function",
+            "trace_id": function_run_record_id,
+            "ipt": record["ipt"],
+            "should_be_canceled_at": record["should_be_canceled_at"]})
+
+    def _client_get_byte_value_by_key(self, key, _):
+        data = self.state.objects.get(key)
+        if data is None:
+            self._reply(None, 404, "key not found")
+            return
+        self._reply(base64.b64encode(data).decode())
+        # key is {function_run_record_id}-{ipt_index}-{component_index}
+        self.state.mark(key.partition("-")[0], "ipt_downloaded")
+
+    def _client_report_log(self, _, body):
+        with self.state.lock:
+            self.state.log_lines += len(body.get("logs") or [])
+        self._reply(None)
+
+    def _client_report_progress(self, _, body):
+        self._reply(None)
+
+    def _client_function_run_start(self, _, body):
+        self.state.mark(body["function_run_record_id"], "started")
+        self._reply(None)
+
+    def _client_function_run_finished(self, _, body):
+        function_run_record_id = body["function_run_record_id"]
+        record = self.state.records.get(function_run_record_id)
+        if record is not None:
+            record["suc"] = body.get("suc")
+            record["timeout_canceled"] = body.get("timeout_canceled")
+        self.state.mark(function_run_record_id, "finished")
+        self._reply(None)
+
+    def _client_persist_certain_function_run_opt_field(self, _, body):
+        data = json.dumps(body.get("data")).encode()
+        key = self.state.new_id("opt")
+        self.state.objects[key] = data
+        self._reply({"object_storage_key": key, "brief": data[:50].decode(errors="ignore")})
+
+    # bench api
+    def _bench_new_run(self, _, body):
+        """body: {"function_id": str, "ipt": [[component's raw data str]],
+        "should_be_canceled_at": optional RFC 3339 time str}"""
+        function_run_record_id = self.state.new_id("run")
+        ipt: List[List[Dict[str, str]]] = []
+        for ipt_index, components in enumerate(body["ipt"]):
+            ipt.append([])
+            for component_index, data in enumerate(components):
+                key = f"{function_run_record_id}-{ipt_index}-{component_index}"
+                self.state.objects[key] = data.encode()
+                ipt[-1].append({"brief": data[:50], "object_storage_key": key})
+        self.state.records[function_run_record_id] = {
+            "function_id": body["function_id"],
+            "ipt": ipt,
+            "should_be_canceled_at": body.get("should_be_canceled_at", ""),
+            "phases": {}}
+        self._reply(function_run_record_id)
+
+    def _bench_stats(self, _, body):
+        with self.state.lock:
+            self._reply({
+                "records": {
+                    k: {
+                        "phases": v["phases"],
+                        "suc": v.get("suc"),
+                        "timeout_canceled": v.get("timeout_canceled")}
+                    for k, v in self.state.records.items()},
+                "request_counts": dict(self.state.request_counts),
+                "log_lines": self.state.log_lines})
+
+
+def serve(port: int, ready=None):
+    _Handler.state = _State()
+    server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+    server.daemon_threads = True
+    if ready is not None:
+        ready.set()
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
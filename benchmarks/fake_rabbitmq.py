@@ -0,0 +1,67 @@
+"""in-process stand-in of bloc_client.internal.rabbitmq.RabbitMQ.
+Same consume/ack/nack behavior(push, at most prefetch_count unacked), no broker needed"""
+import time
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+
+class FakeRabbitMQ:
+    def __init__(self, prefetch_count: int=1):
+        self.prefetch_count = prefetch_count
+        self._cond = threading.Condition()
+        self._ready: Deque[Tuple[bytes, float]] = deque()
+        # delivery_tag: (body, published_at)
+        self._unacked: Dict[int, Tuple[bytes, float]] = {}
+        self._delivery_tag = 0
+        self._closed = False
+        # publish to deliver seconds of each delivered msg
+        self.queue_waits = []
+
+    def consume_prepare(self, queue_name: str, routing_key: str):
+        pass
+
+    def publish(self, body: bytes):
+        with self._cond:
+            self._ready.append((body, time.time()))
+            self._cond.notify_all()
+
+    def consume(
+        self,
+        queue_name: str,
+        on_message: Callable[[int, bytes], None],
+        prefetch_count: Optional[int]=None,
+    ):
+        """blocks until close"""
+        if prefetch_count:
+            self.prefetch_count = prefetch_count
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or (
+                        self._ready and len(self._unacked) < self.prefetch_count))
+                if self._closed:
+                    return
+                body, published_at = self._ready.popleft()
+                self._delivery_tag += 1
+                delivery_tag = self._delivery_tag
+                self._unacked[delivery_tag] = (body, published_at)
+                self.queue_waits.append(time.time() - published_at)
+            on_message(delivery_tag, body)
+
+    def ack(self, delivery_tag: int):
+        with self._cond:
+            self._unacked.pop(delivery_tag, None)
+            self._cond.notify_all()
+
+    def nack(self, delivery_tag: int, requeue: bool=True):
+        with self._cond:
+            msg = self._unacked.pop(delivery_tag, None)
+            if requeue and msg is not None:
+                self._ready.appendleft(msg)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
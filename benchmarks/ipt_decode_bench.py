@@ -0,0 +1,61 @@
+"""compare array ipt decoding of value_decoder against the old eval path.
+
+    python -m benchmarks.ipt_decode_bench [item_count]
+"""
+import sys
+import time
+import tracemalloc
+
+from bloc_client.value_type import ValueType
+from bloc_client.internal.value_decoder import ArrayFormat, decode_value
+
+
+def _eval_decode(data: bytes, value_type: ValueType, is_array: bool):
+    # the decoding path before value_decoder
+    return eval(data.decode())
+
+
+def _measure(decode, data: bytes, value_type: ValueType):
+    """time a run without tracemalloc, which slows decoding down many times,
+    then take the memory of another run under it"""
+    start = time.perf_counter()
+    value = decode(data, value_type, True)
+    cost = time.perf_counter() - start
+    del value
+
+    tracemalloc.start()
+    value = decode(data, value_type, True)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, cost, retained, peak
+
+
+def main(item_count: int):
+    cases = {
+        ValueType.intValueType: str(list(range(item_count))).encode(),
+        ValueType.floatValueType: str([i / 3 for i in range(item_count)]).encode(),
+    }
+    decoders = {
+        "eval(old)": _eval_decode,
+        "list": lambda d, t, a: decode_value(d, t, a, ArrayFormat.list),
+        "array": lambda d, t, a: decode_value(d, t, a, ArrayFormat.array),
+    }
+    try:
+        import numpy  # noqa
+        decoders["numpy"] = lambda d, t, a: decode_value(d, t, a, ArrayFormat.numpy)
+    except ImportError:
+        pass
+
+    print(f"{item_count} items per array")
+    print(f"{'value_type':<12}{'decoder':<12}{'seconds':>10}{'retained MB':>13}{'peak MB':>10}")
+    for value_type, data in cases.items():
+        for name, decode in decoders.items():
+            value, cost, retained, peak = _measure(decode, data, value_type)
+            assert len(value) == item_count
+            print(
+                f"{value_type.value:<12}{name:<12}{cost:>10.3f}"
+                f"{retained / 1024 / 1024:>13.1f}{peak / 1024 / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
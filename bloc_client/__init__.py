@@ -3,9 +3,15 @@ from bloc_client.bloc_client import BlocClient
 from bloc_client.value_type import ValueType
 from bloc_client.function_opt import FunctionOpt
 from bloc_client.function_run_log import LogLevel
+from bloc_client.internal.tracing import Span
+from bloc_client.run_profile import RunProfile
 from bloc_client.select_options import SelectOption
 from bloc_client.function_run_opt import FunctionRunOpt
 from bloc_client.formcontrol_type import FormControlType
+from bloc_client.execution_policy import ExecutionPolicy
+from bloc_client.internal.value_decoder import ArrayFormat
+from bloc_client.function_test_run import FunctionTestRunResult
 from bloc_client.function_interface import FunctionInterface
 from bloc_client.function_run_queue import FunctionRunMsgQueue
+from bloc_client.span_sink import SpanSink, JsonLinesSpanSink, OTLPHttpSpanSink
 from bloc_client.function_ipt import FunctionIpt, IptComponent
\ No newline at end of file
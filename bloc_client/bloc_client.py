@@ -1,31 +1,109 @@
 import json
+import mmap
+import time
 import os.path
 import asyncio
+import hashlib
+import inspect
 import logging
-from copy import deepcopy
+import threading
 from functools import partial
 from datetime import datetime
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from multiprocessing import Process, Manager
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
 
 from bloc_client.internal.gen_uuid import new_uuid
 from bloc_client.internal.rabbitmq import RabbitMQ
+from bloc_client.internal.tracing import Span, tracer, keep_export_spans
+from bloc_client.internal.metrics import metrics, keep_write_textfile, serve_metrics
+from bloc_client.internal.worker_pool import WorkerPool, WorkerDeadlineExceeded, WorkerExited, retire_worker, run_in_worker_loop, set_run_info
+from bloc_client.internal.content_cache import ContentCache
+from bloc_client.internal.value_decoder import ArrayFormat
+from bloc_client.value_type import ValueType
 from bloc_client.function_run_opt import FunctionRunOpt
 from bloc_client.function import Function, FunctionGroup
 from bloc_client.function_interface import FunctionInterface
-from bloc_client.function_run_queue import FunctionRunMsgQueue
-from bloc_client.function_run_log import Logger, FunctionRunMsg
+from bloc_client.function_test_run import FunctionTestRunResult, new_test_run_ipts, measure_test_run
+from bloc_client.span_sink import SpanSink
+from bloc_client.function_ipt import FunctionIpt, LazyIptComponent
+from bloc_client.execution_policy import ExecutionPolicy
+from bloc_client.run_profile import RunProfile, RunProfiler
+from bloc_client.function_run_queue import FunctionRunMsgQueue, AsyncFunctionRunMsgQueue, InProcessFunctionRunMsgQueue, SharedMemoryFunctionRunMsgQueue, SharedMemoryMinBytes
+from bloc_client.function_run_log import Logger, LogLevel, FunctionRunMsg
+from bloc_client.function_run_report_outbox import FunctionRunReportOutbox, send_report
 from bloc_client.function_to_run_mq_msg import FunctionToRunMqMsg
-from bloc_client.internal.http_util import post_to_server, sync_post_to_server
-from bloc_client.object_storage import get_data_by_object_storage_key, persist_opt_to_server
-from bloc_client.function_run_record import get_functionRunRecord_by_id, report_function_run_finished, report_function_run_start
-from bloc_client.function_run_progress_report import HighReadableFunctionRunProgress, report_function_run_high_readable_progress
+from bloc_client.internal.http_util import HttpPoolConfig, post_to_server, set_pool_config
+from bloc_client.object_storage import get_data_by_object_storage_key, async_get_data_by_object_storage_key, async_get_mmap_by_object_storage_key, async_persist_opt_to_server
+from bloc_client.function_run_record import FunctionRunRecord, async_get_functionRunRecord_by_id, async_report_function_run_finished, async_report_function_run_start
+from bloc_client.function_run_progress_report import HighReadableFunctionRunProgress, HighReadableFunctionRunProgressReporter, ProgressReportMinInterval
 
 ServerBasicPathPrefix = "/api/v1/client/"
 RegisterFuncPath = "register_functions"
+IptDownloadConcurrency = 8
+OptPersistConcurrency = 8
+AsyncFunctionConcurrency = 100
+# a sync run waits this long for a worker, then it's requeued for other clients
+SyncSlotWaitSeconds = 1.0
+HeartbeatInterval = 10.0
+MetricsTextfileInterval = 15.0
+SpanExportInterval = 5.0
+SpanExportBatchSize = 512
+
+
+def _timeout_canceled_opt() -> FunctionRunOpt:
+    return FunctionRunOpt(
+        suc=False,
+        timeout_canceled=True,
+        intercept_below_function_run=True,
+        error_msg="function run not finished before should_be_canceled_at")
+
+
+def _functions_fingerprint(register_to_server_dict: Dict[str, Any]) -> str:
+    """short hash of registered functions, changes when any of them changes"""
+    functions = json.dumps(
+        register_to_server_dict["groupName_map_functions"],
+        sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(functions.encode()).hexdigest()[:16]
+
+
+def _failed_opt(error_msg: str) -> FunctionRunOpt:
+    return FunctionRunOpt(
+        suc=False,
+        intercept_below_function_run=True,
+        error_msg=error_msg)
+
+
+def _run_result(function_run_opt: FunctionRunOpt) -> str:
+    if function_run_opt.timeout_canceled:
+        return "timeout_canceled"
+    if function_run_opt.canceled:
+        return "canceled"
+    return "suc" if function_run_opt.suc else "failed"
+
+
+def _wait_seconds(wait: Optional[float], deadline: Optional[float]) -> Optional[float]:
+    """wait, but not beyond deadline"""
+    if deadline is None:
+        return wait
+    left = max(0, deadline - time.time())
+    return left if wait is None else min(wait, left)
+
+
+async def _acquire_within(semaphore: asyncio.Semaphore, timeout: float) -> bool:
+    """return whether semaphore is acquired in timeout seconds"""
+    acquire = asyncio.ensure_future(semaphore.acquire())
+    done, _ = await asyncio.wait({acquire}, timeout=timeout)
+    if not done:
+        acquire.cancel()
+        try:
+            # it may have acquired just before cancel
+            await acquire
+        except asyncio.CancelledError:
+            return False
+    return True
 
 
 @dataclass
@@ -61,6 +139,31 @@ class ConfigBuilder:
     server_conf: Optional[BlocServerConfig]=None
     rabbitMQ_conf: Optional[RabbitMQServerConfig]=None
     rabbit: Optional[RabbitMQ]=None
+    concurrency: int=1
+    max_runs_per_worker: int=0
+    max_worker_memory_mb: int=0
+    progress_report_min_interval: float=ProgressReportMinInterval
+    ipt_download_concurrency: int=IptDownloadConcurrency
+    opt_persist_concurrency: int=OptPersistConcurrency
+    ipt_cache: Optional[ContentCache]=None
+    ipt_array_format: ArrayFormat=ArrayFormat.list
+    ipt_stream_dir: str=""
+    lazy_ipt: bool=False
+    lazy_ipt_prefetch: bool=False
+    opt_shared_memory_min_bytes: int=0
+    async_concurrency: int=AsyncFunctionConcurrency
+    heartbeat_interval: float=HeartbeatInterval
+    heartbeat_compact: bool=False
+    metrics_host: str="127.0.0.1"
+    metrics_port: int=0
+    metrics_textfile: str=""
+    metrics_textfile_interval: float=MetricsTextfileInterval
+    run_profile: Optional[RunProfile]=None
+    span_sink: Optional[SpanSink]=None
+    span_export_interval: float=SpanExportInterval
+    span_export_batch_size: int=SpanExportBatchSize
+    http_pool: HttpPoolConfig=field(default_factory=HttpPoolConfig)
+    nonblocking_report: bool=False
 
     def set_server(self, ip: str, port: int) -> 'ConfigBuilder':
         self.server_conf = BlocServerConfig(ip=ip, port=port)
@@ -75,6 +178,202 @@ class ConfigBuilder:
             user=user, password=password,
             host=host, port=port, v_host=v_host)
         return self
+
+    def set_concurrency(self, concurrency: int) -> 'ConfigBuilder':
+        """how many function runs this client can execute at the same time.
+        also used as rabbitMQ's prefetch_count"""
+        if concurrency < 1:
+            raise Exception("concurrency must be greater than 0")
+        self.concurrency = concurrency
+        return self
+
+    def set_worker_recycle(
+        self,
+        max_runs_per_worker: int=0,
+        max_worker_memory_mb: int=0,
+    ) -> 'ConfigBuilder':
+        """replace a function run worker process after it finished
+        max_runs_per_worker runs or it's memory exceed max_worker_memory_mb.
+        0 means no limit"""
+        self.max_runs_per_worker = max_runs_per_worker
+        self.max_worker_memory_mb = max_worker_memory_mb
+        return self
+
+    def set_progress_report_min_interval(self, seconds: float) -> 'ConfigBuilder':
+        """min interval between two progress reports of a function run,
+        progress reported in between are coalesced and only the latest is sent.
+        progress milestone change is always reported at once"""
+        self.progress_report_min_interval = seconds
+        return self
+
+    def set_ipt_download_concurrency(self, concurrency: int) -> 'ConfigBuilder':
+        """max concurrent ipt component downloads of one function run"""
+        if concurrency < 1:
+            raise Exception("ipt download concurrency must be greater than 0")
+        self.ipt_download_concurrency = concurrency
+        return self
+
+    def set_opt_persist_concurrency(self, concurrency: int) -> 'ConfigBuilder':
+        """max concurrent opt persists of one function run"""
+        if concurrency < 1:
+            raise Exception("opt persist concurrency must be greater than 0")
+        self.opt_persist_concurrency = concurrency
+        return self
+
+    def set_ipt_cache(
+        self,
+        memory_bytes: int,
+        disk_dir: str="",
+        disk_bytes: int=0,
+    ) -> 'ConfigBuilder':
+        """cache downloaded ipt data by it's object storage key.
+        each function run worker has it's own memory tier of memory_bytes,
+        the disk tier in disk_dir is shared by all workers"""
+        self.ipt_cache = ContentCache(
+            memory_bytes=memory_bytes,
+            disk_dir=disk_dir,
+            disk_bytes=disk_bytes)
+        return self
+
+    def set_ipt_array_format(self, array_format: ArrayFormat) -> 'ConfigBuilder':
+        """what int/float array ipt value functions receive: list(default),
+        compact array.array or numpy.ndarray. applies to all functions of the client"""
+        self.ipt_array_format = array_format
+        return self
+
+    def set_ipt_stream_dir(self, dir: str) -> 'ConfigBuilder':
+        """where temp files of stream_to_file ipt components are kept.
+        system temp dir by default"""
+        self.ipt_stream_dir = dir
+        return self
+
+    def set_lazy_ipt(self, prefetch: bool=False) -> 'ConfigBuilder':
+        """download ipt component's value at it's first access in function's run,
+        so function returns early never download unused ipts.
+        prefetch: start downloading all of them in background when run begins.
+        stream_to_file components are not lazy"""
+        self.lazy_ipt = True
+        self.lazy_ipt_prefetch = prefetch
+        return self
+
+    def set_opt_shared_memory(self, min_bytes: int=SharedMemoryMinBytes) -> 'ConfigBuilder':
+        """pass function run's opt from runner process through shared memory
+        instead of pipe when it's pickled size is at least min_bytes. Only
+        test_run_function runs in a process of it's own, runs of the client are
+        in it's workers and their opts never cross processes. It's reader copies
+        the opt out and frees the block, so only the pipe is saved, not a copy"""
+        self.opt_shared_memory_min_bytes = min_bytes
+        return self
+
+    def set_async_concurrency(self, concurrency: int) -> 'ConfigBuilder':
+        """max runs of `async def run()` functions on the client's event loop at
+        the same time, they don't take function run worker. only used if the
+        client has async functions, then prefetch_count is concurrency plus it.
+        sync runs still run at most concurrency at a time, one waits for a
+        worker at most SyncSlotWaitSeconds, then it's requeued to rabbitMQ"""
+        if concurrency < 1:
+            raise Exception("async concurrency must be greater than 0")
+        self.async_concurrency = concurrency
+        return self
+
+    def set_heartbeat(
+        self, interval: float=HeartbeatInterval, compact: bool=False,
+    ) -> 'ConfigBuilder':
+        """heartbeat to server every interval seconds with full functions.
+        compact heartbeat only sends the fingerprint of functions registered,
+        set it only if server accepts that"""
+        if interval <= 0:
+            raise Exception("heartbeat interval must be greater than 0")
+        self.heartbeat_interval = interval
+        self.heartbeat_compact = compact
+        return self
+
+    def set_metrics(
+        self,
+        port: int=0,
+        host: str="127.0.0.1",
+        textfile: str="",
+        textfile_interval: float=MetricsTextfileInterval,
+    ) -> 'ConfigBuilder':
+        """expose run phase latencies, http requests, log volume... in
+        prometheus text format. port not 0: serve them at http://host:port/metrics.
+        textfile not empty: write them to the file every textfile_interval
+        seconds, for node_exporter's textfile collector"""
+        self.metrics_host = host
+        self.metrics_port = port
+        self.metrics_textfile = textfile
+        self.metrics_textfile_interval = textfile_interval
+        return self
+
+    def set_run_profile(self, profile: RunProfile) -> 'ConfigBuilder':
+        """profile sampled runs of functions which has no profile of their own,
+        like RunProfile(every=100) for cProfile of 1 in 100 runs"""
+        if profile.every < 1:
+            raise Exception("profile every must be greater than 0")
+        self.run_profile = profile
+        return self
+
+    def set_span_export(
+        self,
+        sink: SpanSink,
+        interval: float=SpanExportInterval,
+        batch_size: int=SpanExportBatchSize,
+    ) -> 'ConfigBuilder':
+        """record a span for each phase of every run(record fetch, each ipt
+        download, run, each opt persist, finish report...) under the run's
+        trace_id & span_id, and export them to sink every interval seconds
+        in batches of at most batch_size spans"""
+        if batch_size < 1:
+            raise Exception("span export batch_size must be greater than 0")
+        self.span_sink = sink
+        self.span_export_interval = interval
+        self.span_export_batch_size = batch_size
+        return self
+
+    def set_http2(self, enabled: bool=True) -> 'ConfigBuilder':
+        """send requests of runs to bloc-server over HTTP/2(needs h2 installed
+        and bloc-server accepting h2c), so concurrent runs of a worker, or async
+        functions of the client, share one multiplexed connection"""
+        if enabled:
+            try:
+                import h2
+            except ImportError:
+                raise Exception("http2 needs h2 installed: pip install httpx[http2]")
+        self.http_pool.http2 = enabled
+        return self
+
+    def set_http_pool(
+        self,
+        max_connections: int=20,
+        max_keepalive_connections: int=8,
+        keepalive_expiry: float=5.0,
+        timeout: float=20.0,
+        retries: int=3,
+    ) -> 'ConfigBuilder':
+        """connection pool to bloc-server of each process, made when it first
+        sends a request and kept for later runs of it. Pool workers keep
+        max_keepalive_connections idle connections for keepalive_expiry seconds,
+        so runs coming within it skip connecting. retries: times a failed
+        connect is retried"""
+        if max_connections < 1:
+            raise Exception("max_connections must be greater than 0")
+        if retries < 0:
+            raise Exception("retries must not be negative")
+        self.http_pool = HttpPoolConfig(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+            timeout=timeout,
+            retries=retries,
+            http2=self.http_pool.http2)
+        return self
+
+    def set_nonblocking_report(self, enabled: bool=True) -> 'ConfigBuilder':
+        """runs don't wait for their start/progress/finished reports to server.
+        They are sent in order by a per run outbox, the start report goes along
+        with ipt downloading. The msg is still acked after all are sent"""
+        self.nonblocking_report = enabled
+        return self
     
     def build_up(self):
         if self.server_conf.is_nil:
@@ -85,14 +384,19 @@ class ConfigBuilder:
         self.rabbit = RabbitMQ(
             self.rabbitMQ_conf.user, self.rabbitMQ_conf.password,
             self.rabbitMQ_conf.host, self.rabbitMQ_conf.port,
-            self.rabbitMQ_conf.v_host)
+            self.rabbitMQ_conf.v_host,
+            prefetch_count=self.concurrency)
 
 
 @dataclass
 class BlocClient:
     name: str
     function_groups: List[FunctionGroup] = field(default_factory=list)
-    configBuilder: ConfigBuilder = field(default=ConfigBuilder())
+    configBuilder: ConfigBuilder = field(default_factory=ConfigBuilder)
+    # filled by register_functions_to_server, as function's id is given by server
+    id_map_function: Dict[str, Function] = field(default_factory=dict)
+    # what register_functions_to_server sent, with it's functions_fingerprint
+    registered_req: Dict[str, Any] = field(default_factory=dict)
 
     @staticmethod
     def new_client(client_name: str) -> "BlocClient":
@@ -119,29 +423,38 @@ class BlocClient:
     def test_run_function(
         self, 
         user_func: FunctionInterface,
-        params: List[List[Any]]
+        params: List[List[Any]],
+        execution_policy: ExecutionPolicy=ExecutionPolicy.process,
     ):
-        ipts = user_func.ipt_config()
-        for ipt_index, ipt in enumerate(ipts):
-            must = ipts[ipt_index].must
-            if must:
-                if len(params) - 1 < ipt_index:
-                    raise Exception(
-                        f"index {ipt_index} is a cannot be nil ipt, but params has no this data")
-                if len(params[ipt_index]) < len(ipts[ipt_index].components):
-                    raise Exception(
-                        f"index {ipt_index} need {len(ipts[ipt_index].components)} component value, "
-                        f"but param only provide {len(params[ipt_index])} value"
-                    )
-
-            if ipt_index >= len(params): break
-            for component_index, _ in enumerate(ipt.components):
-                if component_index >= len(params[ipt_index]):
-                    ipts[ipt_index].components[component_index].value = None
-                else:
-                    ipts[ipt_index].components[component_index].value = params[ipt_index][component_index]
-        
-        q = FunctionRunMsgQueue.New()
+        ipts = new_test_run_ipts(user_func, params)
+
+        if inspect.iscoroutinefunction(user_func.run):
+            q = InProcessFunctionRunMsgQueue.New()
+            runner_return_dict = {}
+            asyncio.run(user_func.run(ipts, q))
+            self._mock_read(q, runner_return_dict)
+            return runner_return_dict['return_value']
+
+        if execution_policy != ExecutionPolicy.process:
+            q = InProcessFunctionRunMsgQueue.New()
+            runner_return_dict = {}
+            if execution_policy == ExecutionPolicy.inline:
+                user_func.run(ipts, q)
+                self._mock_read(q, runner_return_dict)
+            else:
+                runner = threading.Thread(
+                    target=user_func.run, 
+                    args=(ipts, q))
+                runner.start()
+                self._mock_read(q, runner_return_dict)
+                runner.join()
+            return runner_return_dict['return_value']
+
+        if self.configBuilder.opt_shared_memory_min_bytes:
+            q = SharedMemoryFunctionRunMsgQueue.New(
+                self.configBuilder.opt_shared_memory_min_bytes)
+        else:
+            q = FunctionRunMsgQueue.New()
         runner_return_dict = Manager().dict()
 
         runner = Process(
@@ -160,21 +473,47 @@ class BlocClient:
 
         return runner_return_dict['return_value']
 
-    @staticmethod
-    async def keep_register_to_server(
-        executor, loop,
-        url: str, req: Dict[str, Any]
-    ):
+    def test_run_function_batch(
+        self,
+        user_func: FunctionInterface,
+        params_list: List[List[List[Any]]],
+        concurrency: int=0,
+        measure_memory: bool=False,
+    ) -> List[FunctionTestRunResult]:
+        """run user_func with each params of params_list across concurrency
+        (cpu count by default) worker processes, run is called inline in them.
+        results are in params_list's order, each with it's time cost. With
+        measure_memory, also memory cost, measured by running each params again
+        under tracemalloc, so user_func runs twice for each"""
+        async def run_all():
+            with WorkerPool(
+                handler=partial(measure_test_run, user_func, measure_memory=measure_memory),
+                size=concurrency or os.cpu_count() or 1,
+            ) as pool:
+                async def run_one(params):
+                    try:
+                        return await pool.submit(params)
+                    except Exception as e:
+                        return FunctionTestRunResult(
+                            opt=None, wall_seconds=0, cpu_seconds=0,
+                            peak_memory_bytes=0, error=str(e))
+                return await asyncio.gather(*[run_one(i) for i in params_list])
+
+        return asyncio.run(run_all())
+
+    async def keep_register_to_server(self):
+        """heartbeat on the event loop, never wait behind function runs"""
+        config = self.configBuilder
+        # functions are registered before heartbeat starts, and not changed since
+        req = self.registered_req
+        if config.heartbeat_compact:
+            req = {"who": req["who"], "functions_fingerprint": req["functions_fingerprint"]}
         while True:
-            resp, err = await loop.run_in_executor(
-                executor, sync_post_to_server,
-                url, req
-            )
+            await asyncio.sleep(config.heartbeat_interval)
+            _, err = await post_to_server(self.register_to_server_url, req)
             if err:
-                # TODO
-                pass
-            await asyncio.sleep(10)
-    
+                logging.warning(f"heartbeat to server failed: {err}")
+
     @property
     def register_to_server_dict(self):
         groupName_map_functions = {}
@@ -204,11 +543,12 @@ class BlocClient:
     # 1. register local functions to server
     # 2. get server's resp of each function's id. it's needed in consumer to find func by id
     async def register_functions_to_server(self):
-        resp, err = await post_to_server(
-            self.register_to_server_url,
-            self.register_to_server_dict)
+        req = self.register_to_server_dict
+        req["functions_fingerprint"] = _functions_fingerprint(req)
+        resp, err = await post_to_server(self.register_to_server_url, req)
         if err:
             raise Exception(f"register to server failed: {err}")
+        self.registered_req = req
         groupName_map_functions = resp['groupName_map_functions']
 
         groupname_map_funcname_map_func_resp = {}
@@ -227,6 +567,7 @@ class BlocClient:
                 if not server_resp_func:
                     raise Exception(f'server resp none of function: {group_name}-{j.name}')
                 j.id = server_resp_func['id']
+                self.id_map_function[j.id] = j
 
     @classmethod
     def create_function_run_logger(cls, server_url:str, function_run_record_id: str) -> Logger:
@@ -249,12 +590,14 @@ class BlocClient:
             elif isinstance(msg, FunctionRunOpt):
                 logging.info(f'run finished. opt is: {msg}')
                 runner_return_dict['return_value'] = msg
+                # opt is copied into runner_return_dict, free what it was read from
+                q.release()
                 return
             elif isinstance(msg, HighReadableFunctionRunProgress):
                 logging.info(f'progress msg: {msg}')
 
     @classmethod
-    def _read(
+    async def _async_read(
         cls,
         trace_id: str,
         span_id: str,
@@ -262,66 +605,535 @@ class BlocClient:
         function_run_record_id: str,
         logger: Logger,
         q: FunctionRunMsgQueue,
-    ):
+        progress_report_min_interval: float=ProgressReportMinInterval,
+        opt_persist_concurrency: int=OptPersistConcurrency,
+        deadline: Optional[float]=None,
+        metric_labels: Optional[Dict[str, str]]=None,
+        run_start: Optional[float]=None,
+        outbox: Optional[FunctionRunReportOutbox]=None,
+    ) -> bool:
+        """read what runner reported from q till it's finished opt, then persist
+        opts and report finished. return False if the run not finished before
+        deadline, it's reported as timeout canceled.
+        run_start is perf_counter() when the run began.
+        with outbox, progress and finished reports are put into it, not waited"""
+        metric_labels = metric_labels or {}
+        run_start = run_start or time.perf_counter()
+        progress_reporter = HighReadableFunctionRunProgressReporter(
+            trace_id, span_id,
+            server_url,
+            function_run_record_id,
+            min_interval=progress_report_min_interval,
+            outbox=outbox)
         while True:
-            msg = q.get(block=True)
-            if not msg: continue
+            timed_out = deadline is not None and time.time() >= deadline
+            if timed_out:
+                msg = _timeout_canceled_opt()
+            else:
+                msg = await q.async_get(
+                    timeout=_wait_seconds(progress_reporter.wait_seconds(), deadline))
+                await progress_reporter.async_report_if_due()
+                if not msg: continue
 
             if isinstance(msg, FunctionRunMsg):
                 logger.add_msg(msg)
             elif isinstance(msg, FunctionRunOpt):
                 function_run_opt = msg
+                run_seconds = time.perf_counter() - run_start
+                run_end = time.time()
+                metrics.observe(
+                    "bloc_function_run_phase_seconds",
+                    run_seconds, phase="run", **metric_labels)
+                # finished should be the last state server received
+                await progress_reporter.async_flush()
                 if function_run_opt.suc:
                     function_run_opt.optKey_map_briefData = {}
                     function_run_opt.optKey_map_objectStorageKey = {}
 
-                    for opt_key, opt_value in function_run_opt.optKey_map_data.items():
-                        resp, err = persist_opt_to_server(
+                    with metrics.time(
+                        "bloc_function_run_phase_seconds", phase="opt_persist", **metric_labels
+                    ):
+                        persisted = await cls._persist_opts(
                             trace_id, span_id,
                             server_url,
                             function_run_record_id,
-                            opt_key, opt_value)
-                        if err:
-                            # TODO
-                            pass
-                        function_run_opt.optKey_map_objectStorageKey[opt_key] = resp['object_storage_key']
-                        if isinstance(opt_value, bool):
-                            function_run_opt.optKey_map_briefData[opt_key] = str(opt_value)
-                        elif isinstance(opt_value, int):
-                            function_run_opt.optKey_map_briefData[opt_key] = str(opt_value)
-                        elif isinstance(opt_value, float):
-                            function_run_opt.optKey_map_briefData[opt_key] = str(opt_value)
-                        elif isinstance(opt_value, str):
-                            function_run_opt.optKey_map_briefData[opt_key] = opt_value[:50]
-                        else:
-                            function_run_opt.optKey_map_briefData[opt_key] = resp['brief']
-
-                err = report_function_run_finished(
-                    trace_id, span_id,
-                    server_url,
-                    function_run_record_id,
-                    function_run_opt)
+                            function_run_opt.optKey_map_data or {},
+                            opt_persist_concurrency)
+                    cls._fill_persisted_opts(function_run_opt, persisted, logger)
+
+                # after persist, which may fail the run
+                result = _run_result(function_run_opt)
+                metrics.inc("bloc_function_runs_total", result=result, **metric_labels)
+                tracer.record(
+                    "run", trace_id, span_id, run_end - run_seconds, run_end,
+                    attributes=dict(metric_labels, result=result))
+                await send_report(
+                    logger, "function finished",
+                    cls._timed_report(
+                        async_report_function_run_finished(
+                            trace_id, span_id,
+                            server_url,
+                            function_run_record_id,
+                            function_run_opt),
+                        "finish_report", trace_id, span_id, metric_labels),
+                    log_sent=True, outbox=outbox)
+                return not timed_out
+            elif isinstance(msg, HighReadableFunctionRunProgress):
+                await progress_reporter.async_add(msg)
+
+    @classmethod
+    async def _timed_report(
+        cls,
+        report: Awaitable[Optional[Exception]],
+        phase: str,
+        trace_id: str,
+        span_id: str,
+        metric_labels: Dict[str, str],
+    ) -> Optional[Exception]:
+        """await report as a phase of the run, in metrics and spans"""
+        with metrics.time(
+            "bloc_function_run_phase_seconds", phase=phase, **metric_labels
+        ), tracer.span(phase, trace_id, span_id):
+            return await report
+
+    @classmethod
+    def _fill_persisted_opts(
+        cls,
+        function_run_opt: FunctionRunOpt,
+        persisted: List[Tuple[str, Any, Any, Optional[Exception]]],
+        logger: Logger,
+    ):
+        """fill opt's object storage keys and brief data of persisted opts.
+        the run fails if any opt failed to persist, as functions below would
+        read an opt which isn't there"""
+        failed = []
+        for opt_key, opt_value, resp, err in persisted:
+            if err:
+                logger.error(f"persist opt {opt_key} to server failed: {err}")
+                failed.append(opt_key)
+                continue
+            function_run_opt.optKey_map_objectStorageKey[opt_key] = resp['object_storage_key']
+            if isinstance(opt_value, bool):
+                function_run_opt.optKey_map_briefData[opt_key] = str(opt_value)
+            elif isinstance(opt_value, int):
+                function_run_opt.optKey_map_briefData[opt_key] = str(opt_value)
+            elif isinstance(opt_value, float):
+                function_run_opt.optKey_map_briefData[opt_key] = str(opt_value)
+            elif isinstance(opt_value, str):
+                function_run_opt.optKey_map_briefData[opt_key] = opt_value[:50]
+            else:
+                function_run_opt.optKey_map_briefData[opt_key] = resp['brief']
+        if failed:
+            function_run_opt.suc = False
+            function_run_opt.intercept_below_function_run = True
+            function_run_opt.error_msg = f"persist opt {', '.join(failed)} to server failed"
+
+    @classmethod
+    async def _persist_opts(
+        cls,
+        trace_id: str,
+        span_id: str,
+        server_url: str,
+        function_run_record_id: str,
+        optKey_map_data: Dict[str, Any],
+        max_concurrency: int,
+    ) -> List[Tuple[str, Any, Any, Optional[Exception]]]:
+        """persist all opts concurrently.
+        return each opt's (opt_key, opt_value, resp, err)"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def persist(opt_key: str, opt_value: Any):
+            async with semaphore:
+                with tracer.span(
+                    "opt_persist", trace_id, span_id, {"opt_key": opt_key},
+                ) as span:
+                    resp, err = await async_persist_opt_to_server(
+                        trace_id, span_id,
+                        server_url,
+                        function_run_record_id,
+                        opt_key, opt_value)
+                    if err and span:
+                        span.error = repr(err)
+            return opt_key, opt_value, resp, err
+
+        return await asyncio.gather(*[
+            persist(opt_key, opt_value)
+            for opt_key, opt_value in optKey_map_data.items()
+        ])
+
+    @classmethod
+    async def _download_ipt_components(
+        cls,
+        server_url: str,
+        function_run_record: FunctionRunRecord,
+        func: Function,
+        max_concurrency: int,
+        cache: Optional[ContentCache]=None,
+        array_format: ArrayFormat=ArrayFormat.list,
+        stream_dir: str="",
+        stream_only: bool=False,
+        trace_id: str="",
+        span_id: str="",
+    ) -> List[Tuple[int, int, str, Any, Optional[Exception]]]:
+        """download all ipt components concurrently, or only stream_to_file ones.
+        return each component's (ipt_index, component_index, object_storage_key, value, err)"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def download(ipt_index: int, component_index: int, object_storage_key: str):
+            component = func.ipts[ipt_index].components[component_index]
+            async with semaphore:
+                with tracer.span(
+                    "ipt_download", trace_id, span_id, {
+                        "ipt_index": ipt_index,
+                        "component_index": component_index,
+                        "object_storage_key": object_storage_key},
+                ) as span:
+                    if component.stream_to_file:
+                        value, err = await async_get_mmap_by_object_storage_key(
+                            server_url, object_storage_key, stream_dir)
+                    else:
+                        value, err = await async_get_data_by_object_storage_key(
+                            server_url, object_storage_key,
+                            component.value_type,
+                            component.allow_multi,
+                            cache,
+                            array_format,
+                        )
+                    if err and span:
+                        span.error = repr(err)
+            return ipt_index, component_index, object_storage_key, value, err
+
+        return await asyncio.gather(*[
+            download(ipt_index, component_index, component_brief_and_key.object_storage_key)
+            for ipt_index, ipt in enumerate(function_run_record.ipt)
+            for component_index, component_brief_and_key in enumerate(ipt)
+            if not stream_only or func.ipts[ipt_index].components[component_index].stream_to_file
+        ])
+
+    @classmethod
+    def _set_downloaded_ipts(
+        cls,
+        ipts: List[FunctionIpt],
+        downloaded: List[Tuple[int, int, str, Any, Optional[Exception]]],
+        logger: Logger,
+    ) -> Optional[Exception]:
+        """return error if any component failed to download, each is logged"""
+        failed = []
+        for ipt_index, component_index, object_storage_key, value, err in downloaded:
+            if err:
+                logger.error(f"""
+                    get_data_by_object_storage_key from server error: {err}.
+                    ipt_index: {ipt_index}, component_index: {component_index},
+                    key:{object_storage_key}""")
+                failed.append(f"ipt {ipt_index} component {component_index}: {err}")
+                continue
+            ipts[ipt_index].components[component_index].value = value
+        if failed:
+            return Exception(f"download ipt failed, {'; '.join(failed)}")
+        return None
+
+    @classmethod
+    async def _report_not_run(
+        cls,
+        error_msg: str,
+        report_args: Tuple[str, str, str, str],
+        logger: Logger,
+        metric_labels: Dict[str, str],
+        outbox: Optional[FunctionRunReportOutbox]=None,
+    ):
+        """report the run finished as failed without running the function"""
+        logger.error(f"function not run: {error_msg}")
+        metrics.inc("bloc_function_runs_total", result="failed", **metric_labels)
+        trace_id, span_id = report_args[:2]
+        await send_report(
+            logger, "function finished",
+            cls._timed_report(
+                async_report_function_run_finished(*report_args, _failed_opt(error_msg)),
+                "finish_report", trace_id, span_id, metric_labels),
+            log_sent=True, outbox=outbox)
+
+    @classmethod
+    def _release_ipts(cls, ipts: List[FunctionIpt]):
+        # release stream_to_file components' temp file
+        for ipt in ipts:
+            for component in ipt.components:
+                if isinstance(component, LazyIptComponent) and not component.loaded:
+                    continue
+                if isinstance(component.value, mmap.mmap):
+                    component.value.close()
+
+    @classmethod
+    def _load_ipt_component(
+        cls,
+        server_url: str,
+        object_storage_key: str,
+        ipt_index: int,
+        component_index: int,
+        value_type: ValueType,
+        allow_multi: bool,
+        q: FunctionRunMsgQueue,
+        cache: Optional[ContentCache]=None,
+        array_format: ArrayFormat=ArrayFormat.list,
+    ) -> Any:
+        """loader of LazyIptComponent, runs in the runner thread"""
+        value, err = get_data_by_object_storage_key(
+            server_url, object_storage_key,
+            value_type, allow_multi,
+            cache, array_format)
+        if err:
+            q.report_log(LogLevel.error, f"""
+                get_data_by_object_storage_key from server error: {err}.
+                ipt_index: {ipt_index}, component_index: {component_index},
+                key:{object_storage_key}""")
+            # function run fails with it, instead of going on with None
+            raise Exception(
+                f"download ipt {ipt_index} component {component_index} failed: {err}")
+        return value
+
+    @classmethod
+    def _run_user_function(
+        cls,
+        exe_func: FunctionInterface,
+        ipts: List[FunctionIpt],
+        q: FunctionRunMsgQueue,
+        prefetch_concurrency: int=0,
+        profiler: Optional[RunProfiler]=None,
+        retire_on_raise: bool=False,
+    ):
+        lazy_components = [
+            component
+            for ipt in ipts for component in ipt.components
+            if isinstance(component, LazyIptComponent)]
+        prefetcher, prefetches = None, []
+        if prefetch_concurrency and lazy_components:
+            prefetcher = ThreadPoolExecutor(max_workers=prefetch_concurrency)
+            prefetches = [prefetcher.submit(i.load) for i in lazy_components]
+        try:
+            if profiler:
+                profiler.run(exe_func.run, ipts, q)
+            else:
+                exe_func.run(ipts, q)
+        except Exception as e:
+            # or the reader would wait for the finished opt forever
+            logging.exception("function run raised exception")
+            if retire_on_raise:
+                retire_worker()
+            q.report_function_run_finished_opt(
+                FunctionRunOpt(
+                    suc=False,
+                    intercept_below_function_run=True,
+                    error_msg=f"function run raised exception: {e!r}"))
+        else:
+            if not q.opt_reported:
+                # or the reader would wait for it forever
+                q.report_function_run_finished_opt(
+                    _failed_opt("function run returned without reporting opt"))
+        finally:
+            if prefetcher:
+                # ipts not fetched yet are never used. shutdown's cancel_futures
+                # is what this does, but only since python 3.9
+                for prefetch in prefetches:
+                    prefetch.cancel()
+                prefetcher.shutdown(wait=False)
+
+    @classmethod
+    async def _async_run_user_function(
+        cls,
+        exe_func: FunctionInterface,
+        ipts: List[FunctionIpt],
+        q: AsyncFunctionRunMsgQueue,
+    ):
+        try:
+            await exe_func.run(ipts, q)
+        except Exception as e:
+            logging.exception("function run raised exception")
+            q.report_function_run_finished_opt(
+                FunctionRunOpt(
+                    suc=False,
+                    intercept_below_function_run=True,
+                    error_msg=f"function run raised exception: {e!r}"))
+        else:
+            if not q.opt_reported:
+                q.report_function_run_finished_opt(
+                    _failed_opt("function run returned without reporting opt"))
+
+    async def _async_run_function(
+        self,
+        msg: FunctionToRunMqMsg,
+        function_run_record: FunctionRunRecord,
+        the_func: Function,
+        record_fetch_time: Optional[Tuple[float, float]]=None,
+    ):
+        """run an async function's run on the event loop"""
+        config = self.configBuilder
+        server_url = self.gen_req_server_path()
+        logger = self.create_function_run_logger(
+            server_url, msg.FunctionRunRecordID)
+        logger.set_loop(asyncio.get_running_loop())
+        trace_id = function_run_record.trace_id
+        logger.set_trace_id(trace_id)
+        span_id = new_uuid()
+        logger.set_span_id(span_id)
+
+        ipts = [i.new_run_ipt() for i in the_func.ipts]
+        metric_labels = {"group": the_func.group_name, "function": the_func.name}
+        run_started_at = record_fetch_time[0] if record_fetch_time else time.time()
+        if record_fetch_time:
+            tracer.record("record_fetch", trace_id, span_id, *record_fetch_time)
+        report_args = (
+            trace_id, span_id,
+            server_url, msg.FunctionRunRecordID)
+        deadline = function_run_record.deadline
+        outbox = FunctionRunReportOutbox(logger) if config.nonblocking_report else None
+        error = ""
+        try:
+            if deadline is not None and time.time() >= deadline:
+                logger.error("function run already exceeded should_be_canceled_at, not run")
+                err = await async_report_function_run_finished(
+                    *report_args, _timeout_canceled_opt())
                 if err:
                     logger.error(f"report function finished failed: {err}")
-                else:
-                    logger.info(f"report function finished")
                 return
-            elif isinstance(msg, HighReadableFunctionRunProgress):
-                func_run_progress = msg
-                err = report_function_run_high_readable_progress(
-                    trace_id, span_id,
-                    server_url, 
-                    function_run_record_id,
-                    func_run_progress)
+
+            await send_report(
+                logger, "function run start",
+                self._timed_report(
+                    async_report_function_run_start(*report_args),
+                    "start_report", trace_id, span_id, metric_labels),
+                outbox=outbox)
+
+            with metrics.time(
+                "bloc_function_run_phase_seconds", phase="ipt_download", **metric_labels
+            ):
+                downloaded = await self._download_ipt_components(
+                    server_url, function_run_record, the_func,
+                    config.ipt_download_concurrency, config.ipt_cache,
+                    config.ipt_array_format, config.ipt_stream_dir,
+                    trace_id=trace_id, span_id=span_id)
+            err = self._set_downloaded_ipts(ipts, downloaded, logger)
+            if err:
+                await self._report_not_run(
+                    str(err), report_args, logger, metric_labels, outbox)
+                return
+
+            q = AsyncFunctionRunMsgQueue.New()
+            run_start = time.perf_counter()
+            runner = asyncio.ensure_future(
+                self._async_run_user_function(the_func.exe_func, ipts, q))
+            finished = await self._async_read(
+                trace_id,
+                span_id,
+                server_url,
+                msg.FunctionRunRecordID,
+                logger,
+                q,
+                config.progress_report_min_interval,
+                config.opt_persist_concurrency,
+                deadline,
+                metric_labels,
+                run_start,
+                outbox,
+            )
+            if not finished:
+                logger.error("function run exceeded should_be_canceled_at, canceled")
+                runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            if outbox:
+                await outbox.close()
+            await logger.async_close()
+            self._release_ipts(ipts)
+            tracer.record(
+                "function_run", trace_id, "", run_started_at,
+                attributes=dict(
+                    metric_labels,
+                    function_id=function_run_record.function_id,
+                    function_run_record_id=msg.FunctionRunRecordID,
+                    execution_policy="async"),
+                span_id=span_id, error=error)
+
+    async def _try_run_async_function(
+        self,
+        async_slots: asyncio.Semaphore,
+        msg_str: str,
+        received_at: Optional[float]=None,
+    ) -> Tuple[bool, Optional[FunctionRunRecord], Optional[Tuple[float, float]]]:
+        """run msg's function on the event loop if it is async.
+        return whether it's run, the function run record fetched and
+        (start, end) time.time() of fetching it"""
+        msg = FunctionToRunMqMsg(**json.loads(msg_str))
+        fetch_started_at = time.time()
+        fetch_start = time.perf_counter()
+        function_run_record, err = await async_get_functionRunRecord_by_id(
+            self.gen_req_server_path(), msg.FunctionRunRecordID)
+        fetch_seconds = time.perf_counter() - fetch_start
+        record_fetch_time = (fetch_started_at, time.time())
+        if err:  # leave it to worker which logs the error
+            return False, None, None
+
+        the_func = self.id_map_function.get(function_run_record.function_id)
+        if not the_func:
+            return False, function_run_record, record_fetch_time
+        metric_labels = {"group": the_func.group_name, "function": the_func.name}
+        metrics.observe(
+            "bloc_function_run_phase_seconds",
+            fetch_seconds, phase="record_fetch", **metric_labels)
+        if not the_func.is_async:
+            return False, function_run_record, record_fetch_time
+
+        async with async_slots:
+            if received_at:
+                metrics.observe(
+                    "bloc_function_run_queue_wait_seconds",
+                    time.time() - received_at, **metric_labels)
+            await self._async_run_function(
+                msg, function_run_record, the_func, record_fetch_time)
+        return True, function_run_record, record_fetch_time
 
     @classmethod
-    def _run_function(
+    def _run_function_in_worker(
+        cls, *args, **kwargs,
+    ) -> Tuple[Optional[dict], List[Span]]:
+        """_run_function in a pool worker. return metrics and spans recorded in
+        this worker since last run, the pool process merges them"""
+        try:
+            run_in_worker_loop(cls._run_function(*args, **kwargs))
+        finally:
+            taken = metrics.take(), tracer.take()
+        return taken
+
+    @classmethod
+    async def _run_function(
         cls,
         msg_str: str,
         client_name: str,
         server_url: str,
-        function_groups: List[FunctionGroup],
+        id_map_function: Dict[str, Function],
+        progress_report_min_interval: float=ProgressReportMinInterval,
+        ipt_download_concurrency: int=IptDownloadConcurrency,
+        opt_persist_concurrency: int=OptPersistConcurrency,
+        ipt_cache: Optional[ContentCache]=None,
+        ipt_array_format: ArrayFormat=ArrayFormat.list,
+        ipt_stream_dir: str="",
+        lazy_ipt: bool=False,
+        lazy_ipt_prefetch: bool=False,
+        run_profile: Optional[RunProfile]=None,
+        nonblocking_report: bool=False,
+        function_run_record: Optional[FunctionRunRecord]=None,
+        record_fetch_time: Optional[Tuple[float, float]]=None,
+        received_at: Optional[float]=None,
     ):
+        """the whole lifecycle of a run, on the worker's loop. requests to server
+        share the worker's async connection pool, only user function's run is
+        in a thread of the worker.
+        record_fetch_time: (start, end) time.time() of fetching function_run_record
+        if it's given. received_at: time.time() when the msg is delivered to client"""
         msg_dict = json.loads(msg_str)
         msg = FunctionToRunMqMsg(**msg_dict)
         if msg.ClientName != client_name:
@@ -330,129 +1142,357 @@ class BlocClient:
                 Not mine functions msg routed here!
                 {msg_dict}""")
         
+        loop = asyncio.get_running_loop()
         logger = cls.create_function_run_logger(
             server_url, msg.FunctionRunRecordID)
-        
-        function_run_record, err = get_functionRunRecord_by_id(
-            server_url, msg.FunctionRunRecordID)
-        if err:
-            logger.error(f"get_functionRunRecord_by_id from server error: {err}")
-            #TODO
-            pass
-        
-        the_func = None
-        for function_group in function_groups:
-            if the_func: break
-            for f in function_group.functions:
-                if f.id == function_run_record.function_id:
-                    the_func = deepcopy(f)
-                    break
-
-        logger.set_trace_id(function_run_record.trace_id)
-        span_id = new_uuid()
-        logger.set_span_id(span_id)
+        logger.set_loop(loop)
 
-        err = report_function_run_start(
-            function_run_record.trace_id, span_id,
-            server_url, msg.FunctionRunRecordID)
-        if err:
-            logger.error(f"report function run start to server error: {err}")
-
-        for ipt_index, ipt in enumerate(function_run_record.ipt):
-            for component_index, component_brief_and_key in enumerate(ipt):
-                value, err = get_data_by_object_storage_key(
-                    server_url, component_brief_and_key.object_storage_key,
-                    the_func.ipts[ipt_index].components[component_index].value_type,
-                    the_func.ipts[ipt_index].components[component_index].allow_multi,
-                )
+        ipts = []
+        q = None
+        outbox = FunctionRunReportOutbox(logger) if nonblocking_report else None
+        run_started_at = record_fetch_time[0] if record_fetch_time else time.time()
+        trace_id, span_id, span_attributes, error = "", "", {}, ""
+        deadline, run_info_set = None, False
+        try:
+            fetch_seconds = None
+            if not function_run_record:
+                fetch_start = time.perf_counter()
+                function_run_record, err = await async_get_functionRunRecord_by_id(
+                    server_url, msg.FunctionRunRecordID)
+                fetch_seconds = time.perf_counter() - fetch_start
+                record_fetch_time = (run_started_at, time.time())
                 if err:
-                    logger.error(f"""
-                        get_data_by_object_storage_key from server error: {err}.
-                        ipt_index: {ipt_index}, component_index: {component_index},
-                        key:{component_brief_and_key.object_storage_key}""")
-                    # TODO
-                    pass
-                the_func.ipts[ipt_index].components[component_index].value = value
-
-        q = FunctionRunMsgQueue.New()
-        # TODO 超时检测
-
-        # start run & keep upload intime msg
-        runner = Process(
-            target=the_func.exe_func.run, 
-            args=(
-                the_func.ipts, q,
-            )
-        )
+                    logger.error(f"get_functionRunRecord_by_id from server error: {err}")
+                    # or the flow would wait for this run forever
+                    err = await async_report_function_run_finished(
+                        "", "", server_url, msg.FunctionRunRecordID,
+                        _failed_opt(f"get function run record failed: {err}"))
+                    if err:
+                        logger.error(f"report function finished failed: {err}")
+                    return
 
-        reader = Process(
-            target=cls._read, 
-            args=(
-                function_run_record.trace_id,
+            the_func = id_map_function.get(function_run_record.function_id)
+            if not the_func:
+                logger.error(f"function {function_run_record.function_id} not registered in this client")
+                raise Exception(f"function {function_run_record.function_id} not registered in this client")
+            ipts = [i.new_run_ipt() for i in the_func.ipts]
+            metric_labels = {"group": the_func.group_name, "function": the_func.name}
+            if received_at:
+                metrics.observe(
+                    "bloc_function_run_queue_wait_seconds",
+                    time.time() - received_at, **metric_labels)
+            if fetch_seconds is not None:
+                metrics.observe(
+                    "bloc_function_run_phase_seconds",
+                    fetch_seconds, phase="record_fetch", **metric_labels)
+
+            trace_id = function_run_record.trace_id
+            logger.set_trace_id(trace_id)
+            span_id = new_uuid()
+            logger.set_span_id(span_id)
+            span_attributes = dict(
+                metric_labels,
+                function_id=function_run_record.function_id,
+                function_run_record_id=msg.FunctionRunRecordID,
+                execution_policy=the_func.execution_policy.value)
+            if record_fetch_time:
+                tracer.record("record_fetch", trace_id, span_id, *record_fetch_time)
+
+            report_args = (
+                trace_id, span_id,
+                server_url, msg.FunctionRunRecordID)
+            deadline = function_run_record.deadline
+            if deadline is not None and time.time() >= deadline:
+                logger.error("function run already exceeded should_be_canceled_at, not run")
+                err = await async_report_function_run_finished(
+                    *report_args, _timeout_canceled_opt())
+                if err:
+                    logger.error(f"report function finished failed: {err}")
+                return
+            # pool reports the run finished if this worker dies in it, and
+            # kills the worker if the run is stuck beyond the deadline
+            set_run_info(report_args, deadline)
+            run_info_set = True
+
+            await send_report(
+                logger, "function run start",
+                cls._timed_report(
+                    async_report_function_run_start(*report_args),
+                    "start_report", trace_id, span_id, metric_labels),
+                outbox=outbox)
+
+            policy = the_func.execution_policy
+            # runner is in this worker whatever the policy, the worker process
+            # is what isolates it from the client and from other runs
+            q = InProcessFunctionRunMsgQueue.New()
+            if lazy_ipt:
+                for ipt_index, ipt in enumerate(function_run_record.ipt):
+                    for component_index, component_brief_and_key in enumerate(ipt):
+                        component = ipts[ipt_index].components[component_index]
+                        if component.stream_to_file:
+                            continue
+                        ipts[ipt_index].components[component_index] = LazyIptComponent.New(
+                            component,
+                            partial(
+                                cls._load_ipt_component,
+                                server_url, component_brief_and_key.object_storage_key,
+                                ipt_index, component_index,
+                                component.value_type, component.allow_multi,
+                                q, ipt_cache, ipt_array_format))
+
+            with metrics.time(
+                "bloc_function_run_phase_seconds", phase="ipt_download", **metric_labels
+            ):
+                downloaded = await cls._download_ipt_components(
+                    server_url, function_run_record, the_func,
+                    ipt_download_concurrency, ipt_cache, ipt_array_format,
+                    ipt_stream_dir, stream_only=lazy_ipt,
+                    trace_id=trace_id, span_id=span_id)
+            err = cls._set_downloaded_ipts(ipts, downloaded, logger)
+            if err:
+                await cls._report_not_run(
+                    str(err), report_args, logger, metric_labels, outbox)
+                return
+
+            # start run & keep upload intime msg
+            profile = the_func.profile or run_profile
+            profiler = None
+            if profile and profile.sampled():
+                profiler = RunProfiler(profile, msg.FunctionRunRecordID)
+            runner_args = (
+                the_func.exe_func, ipts, q,
+                ipt_download_concurrency if lazy_ipt_prefetch else 0,
+                profiler,
+                # a fresh worker takes next run, not one a raised run left in
+                policy == ExecutionPolicy.process,
+            )
+            runner = None
+            run_start = time.perf_counter()
+            if policy == ExecutionPolicy.inline:
+                # blocks the worker's loop till it returns, then what it
+                # reported is read below. pool kills the worker if it's stuck
+                cls._run_user_function(*runner_args)
+            else:
+                runner = threading.Thread(
+                    target=cls._run_user_function, args=runner_args, daemon=True)
+                runner.start()
+            # already in a long-lived worker process, read in it directly
+            finished = await cls._async_read(
+                trace_id,
                 span_id,
                 server_url,
                 msg.FunctionRunRecordID,
                 logger,
-                q, 
+                q,
+                progress_report_min_interval,
+                opt_persist_concurrency,
+                # inline run is over already, what it reported is the truth
+                deadline if policy != ExecutionPolicy.inline else None,
+                metric_labels,
+                run_start,
+                outbox,
             )
-        )
-        
-        runner.start()
-        reader.start()
-        runner.join()
-        reader.join()
-        reader.terminate()
-    
+            if finished:
+                if runner:
+                    await loop.run_in_executor(None, runner.join)
+            else:
+                # thread can't be stopped, drop the worker with it
+                logger.error("function run exceeded should_be_canceled_at, worker is retired")
+                retire_worker()
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            if outbox:
+                await outbox.close()
+            if run_info_set:
+                # finished is reported, the worker dying from now on isn't the run's
+                set_run_info(None, deadline)
+            await logger.async_close()
+            if q:
+                q.release()
+            cls._release_ipts(ipts)
+            if span_id:
+                tracer.record(
+                    "function_run", trace_id, "", run_started_at,
+                    attributes=span_attributes, span_id=span_id, error=error)
+
+    @classmethod
+    async def _run_and_ack(
+        cls,
+        pool: WorkerPool,
+        rabbit: RabbitMQ,
+        slots: asyncio.Semaphore,
+        delivery_tag: int,
+        body: bytes,
+        try_run_async: Optional[Callable[..., Awaitable[Tuple[bool, Optional[FunctionRunRecord], Any]]]]=None,
+        received_at: Optional[float]=None,
+        sync_slots: Optional[asyncio.Semaphore]=None,
+    ):
+        """sync_slots: with try_run_async, slots is shared by async runs too,
+        a sync run also holds one of sync_slots(one per worker) while it runs"""
+        requeued, sync_slot_held = False, False
+        try:
+            msg_str = body.decode()
+            function_run_record, record_fetch_time = None, None
+            if try_run_async:
+                run, function_run_record, record_fetch_time = await try_run_async(
+                    msg_str, received_at)
+                if run:
+                    return
+            if sync_slots:
+                sync_slot_held = await _acquire_within(sync_slots, SyncSlotWaitSeconds)
+                if not sync_slot_held:
+                    # all workers busy, don't hold it in a slot async runs need
+                    metrics.inc("bloc_consumer_requeued_total")
+                    rabbit.nack(delivery_tag)
+                    requeued = True
+                    return
+            taken_metrics, spans = await pool.submit(
+                msg_str,
+                function_run_record=function_run_record,
+                record_fetch_time=record_fetch_time,
+                received_at=received_at)
+            metrics.merge(taken_metrics)
+            tracer.extend(spans)
+        except (WorkerDeadlineExceeded, WorkerExited) as e:
+            # worker is gone before it could report
+            logging.error(f"run function of msg {body} failed: {e}")
+            if e.info:
+                if isinstance(e, WorkerDeadlineExceeded):
+                    function_run_opt = _timeout_canceled_opt()
+                else:
+                    function_run_opt = _failed_opt(f"function run failed: {e}")
+                err = await async_report_function_run_finished(*e.info, function_run_opt)
+                if err:
+                    logging.error(f"report function finished failed: {err}")
+        except Exception:
+            logging.exception(f"run function of msg {body} failed")
+        finally:
+            if not requeued:
+                rabbit.ack(delivery_tag)
+            if sync_slot_held:
+                sync_slots.release()
+            slots.release()
+
     @classmethod
     async def _run_consumer(
         cls,
-        executor, 
+        pool: WorkerPool,
         loop,
         rabbit: RabbitMQ, 
         name: str,
-        client_name: str,
-        server_url: str,
-        function_groups: List[FunctionGroup],
+        concurrency: int=1,
+        try_run_async: Optional[Callable[..., Awaitable[Tuple[bool, Optional[FunctionRunRecord], Any]]]]=None,
+        sync_concurrency: int=0,
     ):
-        run_func = partial(
-            cls._run_function,
-            client_name=client_name,
-            server_url=server_url,
-            function_groups=function_groups,
-        )
+        """concurrency is the slots of all runs. with try_run_async, sync runs
+        are limited to sync_concurrency of them"""
         rabbit.consume_prepare(name, name)
 
-        channel = rabbit.channel
+        # deliveries are pushed by broker(at most prefetch_count unacked),
+        # consuming thread hand them over to the loop. idle client just waits
+        deliveries = asyncio.Queue()
+
+        def on_message(delivery_tag: int, body: bytes):
+            loop.call_soon_threadsafe(
+                deliveries.put_nowait, (delivery_tag, body, time.time()))
+
+        def consume():
+            try:
+                rabbit.consume(name, on_message, prefetch_count=concurrency)
+            finally:
+                loop.call_soon_threadsafe(deliveries.put_nowait, None)
+
+        threading.Thread(target=consume, daemon=True).start()
+
+        # each running function holds a slot until it's msg is acked
+        slots = asyncio.Semaphore(concurrency)
+        sync_slots = asyncio.Semaphore(sync_concurrency) if try_run_async else None
+        running_tasks = set()
+
+        def on_task_done(task: asyncio.Task):
+            running_tasks.discard(task)
+            metrics.set_gauge("bloc_consumer_running_runs", len(running_tasks))
+
         while True:
-            method_frame, _, body = channel.basic_get(
-                name,
-                auto_ack=False,
-            )
-            if method_frame:
-                await loop.run_in_executor(
-                    executor, run_func, body.decode())
-                channel.basic_ack(method_frame.delivery_tag)
-            else:
-                await asyncio.sleep(0)
+            delivery = await deliveries.get()
+            if delivery is None:
+                raise Exception("rabbitMQ consumer stopped")
+            delivery_tag, body, received_at = delivery
+            metrics.inc("bloc_consumer_deliveries_total")
+
+            await slots.acquire()
+            task = loop.create_task(
+                cls._run_and_ack(
+                    pool, rabbit, slots, delivery_tag, body,
+                    try_run_async, received_at, sync_slots))
+            running_tasks.add(task)
+            metrics.set_gauge("bloc_consumer_running_runs", len(running_tasks))
+            task.add_done_callback(on_task_done)
 
     async def run(self):
+        # before workers are forked, so they use it too
+        set_pool_config(self.configBuilder.http_pool)
         await self.register_functions_to_server()
 
         loop = asyncio.get_event_loop()
-        with ProcessPoolExecutor(max_workers=2) as executor:
+        config = self.configBuilder
+        # workers are forked with functions already loaded
+        run_func = partial(
+            self._run_function_in_worker,
+            client_name=self.name,
+            server_url=self.gen_req_server_path(),
+            id_map_function=self.id_map_function,
+            progress_report_min_interval=config.progress_report_min_interval,
+            ipt_download_concurrency=config.ipt_download_concurrency,
+            opt_persist_concurrency=config.opt_persist_concurrency,
+            ipt_cache=config.ipt_cache,
+            ipt_array_format=config.ipt_array_format,
+            ipt_stream_dir=config.ipt_stream_dir,
+            lazy_ipt=config.lazy_ipt,
+            lazy_ipt_prefetch=config.lazy_ipt_prefetch,
+            run_profile=config.run_profile,
+            nonblocking_report=config.nonblocking_report,
+        )
+        # async functions run on this loop, each one also holds a msg slot.
+        # sync runs never take more than the workers' share of the slots
+        consume_concurrency = config.concurrency
+        try_run_async = None
+        if any(i.is_async for i in self.id_map_function.values()):
+            consume_concurrency += config.async_concurrency
+            try_run_async = partial(
+                self._try_run_async_function,
+                asyncio.Semaphore(config.async_concurrency))
+
+        # set before workers are forked, so they record spans too
+        tracer.enabled = config.span_sink is not None
+        with WorkerPool(
+            handler=run_func,
+            size=config.concurrency,
+            max_runs_per_worker=config.max_runs_per_worker,
+            max_memory_mb=config.max_worker_memory_mb,
+        ) as pool:
+            exporters = []
+            if config.metrics_port:
+                exporters.append(serve_metrics(config.metrics_host, config.metrics_port))
+            if config.metrics_textfile:
+                exporters.append(keep_write_textfile(
+                    config.metrics_textfile, config.metrics_textfile_interval))
+            if config.span_sink:
+                exporters.append(keep_export_spans(
+                    config.span_sink, config.span_export_interval,
+                    config.span_export_batch_size))
             await asyncio.gather(
-                self.keep_register_to_server(
-                    executor, loop,
-                    self.register_to_server_url,
-                    self.register_to_server_dict,
-                ),
+                *exporters,
+                self.keep_register_to_server(),
                 self._run_consumer(
-                    executor,
+                    pool,
                     loop,
-                    self.configBuilder.rabbit,
+                    config.rabbit,
                     "function_client_run_consumer." + self.name,
-                    self.name, 
-                    self.gen_req_server_path(), 
-                    self.function_groups
+                    consume_concurrency,
+                    try_run_async,
+                    config.concurrency,
                 )
             )
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class ExecutionPolicy(Enum):
+    """where a function's run() is executed"""
+    process = "process"  # a thread in a pool worker process, isolated from the client. the worker is replaced after a run raised or timed out
+    thread = "thread"  # a thread in a pool worker process, which is kept after a run raised
+    inline = "inline"  # on the pool worker's loop, blocking it. it's logs & progress are reported after run() returned
@@ -1,8 +1,11 @@
-from typing import List
+import inspect
+from typing import List, Optional
 from dataclasses import field, dataclass
 
 from bloc_client.function_opt import FunctionOpt
 from bloc_client.function_ipt import FunctionIpt
+from bloc_client.run_profile import RunProfile
+from bloc_client.execution_policy import ExecutionPolicy
 from bloc_client.function_interface import FunctionInterface
 
 
@@ -16,6 +19,13 @@ class Function:
     opts: List[FunctionOpt]
     progress_milestones: List[str]
     exe_func: FunctionInterface=field(default=None)
+    execution_policy: ExecutionPolicy=ExecutionPolicy.process
+    profile: Optional[RunProfile]=None
+
+    @property
+    def is_async(self) -> bool:
+        """whether exe_func's run is `async def`"""
+        return inspect.iscoroutinefunction(getattr(self.exe_func, "run", None))
 
     def json_dict(self):
         return {
@@ -36,8 +46,14 @@ class FunctionGroup:
     def add_function(
         self, 
         name: str, description: str, 
-        func: FunctionInterface
+        func: FunctionInterface,
+        execution_policy: ExecutionPolicy=ExecutionPolicy.process,
+        profile: Optional[RunProfile]=None,
     ):
+        """execution_policy: see ExecutionPolicy. cheap functions can run
+        inline to skip starting a runner thread, if they report nothing
+        that's needed while they are running.
+        profile: profile sampled runs, overrides client's set_run_profile"""
         for i in self.functions:
             if i.name == name:
                 raise Exception("not allowed same function name under same group")
@@ -49,6 +65,8 @@ class FunctionGroup:
                 ipts=func.ipt_config(),
                 opts=func.opt_config(),
                 progress_milestones=func.all_progress_milestones(),
-                exe_func=func
+                exe_func=func,
+                execution_policy=execution_policy,
+                profile=profile,
             )
         )
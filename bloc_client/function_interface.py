@@ -39,4 +39,6 @@ class FunctionInterface(metaclass=abc.ABCMeta):
         ipts: List[FunctionIpt],
         queue: FunctionRunMsgQueue
     ) -> FunctionRunOpt:
+        """can also be implemented as `async def run(...)` for I/O bound functions,
+        which then runs as a coroutine on the client's event loop"""
         raise NotImplementedError
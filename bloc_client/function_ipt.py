@@ -1,5 +1,6 @@
-from dataclasses import dataclass, field
-from typing import List, Any, Optional
+import threading
+from typing import List, Any, Callable, Optional
+from dataclasses import dataclass, field, fields, replace
 
 from bloc_client.value_type import ValueType
 from bloc_client.select_options import SelectOption
@@ -14,6 +15,9 @@ class IptComponent:
     allow_multi: bool
     default_value: Optional[Any]=None
     select_options: List[SelectOption]=field(default_factory=list)
+    # for large input: value is given as a read-only mmap of the raw data
+    # which is streamed into a temp file, instead of a decoded python value
+    stream_to_file: bool=False
     value: Optional[Any]=None
 
     def json_dict(self):
@@ -26,6 +30,46 @@ class IptComponent:
             "select_options": [i.json_dict() for i in self.select_options]
         }
 
+class LazyIptComponent(IptComponent):
+    """IptComponent whose value is loaded by loader at first access.
+    thread safe, concurrent first accesses load only once"""
+
+    @classmethod
+    def New(cls, component: IptComponent, loader: Callable[[], Any]) -> "LazyIptComponent":
+        lazy = cls(**{
+            i.name: getattr(component, i.name)
+            for i in fields(IptComponent) if i.name != "value"})
+        lazy._loader = loader
+        lazy._loaded = False
+        lazy._lock = threading.Lock()
+        return lazy
+
+    @property
+    def value(self) -> Optional[Any]:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self._loader()
+                    self._loaded = True
+        return self._value
+
+    @value.setter
+    def value(self, value: Optional[Any]):
+        self._value = value
+        self._loaded = True
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self):
+        self.value
+
+    def __repr__(self) -> str:
+        value = repr(self._value) if self._loaded else "<not loaded>"
+        return f"LazyIptComponent(value_type={self.value_type}, hint={self.hint!r}, value={value})"
+
+
 @dataclass
 class FunctionIpt:
     key: str
@@ -40,3 +84,11 @@ class FunctionIpt:
             "must": self.must,
             "components": [i.json_dict() for i in self.components]
         }
+
+    def new_run_ipt(self) -> "FunctionIpt":
+        """a copy to hold one function run's component values.
+        only the ipt and it's components are copied, config like
+        default_value and select_options are shared"""
+        return replace(
+            self,
+            components=[replace(i, value=None) for i in self.components])
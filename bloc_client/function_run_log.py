@@ -1,12 +1,24 @@
+import asyncio
+import threading
 from os import path
 from enum import Enum
 from datetime import datetime
+from collections import deque
+from concurrent.futures import CancelledError
+from typing import Any, Deque, Dict, List, Optional
 from dataclasses import dataclass, field
 
-from bloc_client.internal.http_util import sync_post_to_server
+from bloc_client.internal.metrics import metrics
+from bloc_client.internal.http_util import post_to_server, sync_post_to_server
 
 LogReportPath = "report_log"
 
+LogBatchSize = 200  # max log lines in one upload
+LogBatchBytes = 512 * 1024  # max approximate bytes in one upload
+LogFlushInterval = 1.0  # seconds
+LogBufferSize = 10000  # max buffered log lines, oldest are dropped when full
+LogMsgOverheadBytes = 128  # approximate json size of a log line besides it's data
+
 
 class LogLevel(Enum):
     info = "info"
@@ -41,10 +53,33 @@ class LogMsg:
 
 @dataclass
 class Logger:
+    """buffer log lines and upload them in batches.
+    A batch is sent when it reaches batch_size lines / batch_bytes bytes or
+    flush_interval seconds passed. If server can't keep up and the buffer
+    reach buffer_size, oldest lines are dropped and a warning line telling
+    how many were dropped is sent with the next batch.
+    With set_loop, batches are uploaded on that loop's connection pool by a
+    task on it, or else by a thread.
+    close()/async_close() must be called when the function run finished to upload the rest"""
     _server_url: str
     function_run_record_id: str
     trace_id: str=""
     span_id: str=""
+    batch_size: int=LogBatchSize
+    batch_bytes: int=LogBatchBytes
+    flush_interval: float=LogFlushInterval
+    buffer_size: int=LogBufferSize
+    _buffer: Deque[Dict[str, Any]]=field(init=False, repr=False, default_factory=deque)
+    _buffer_bytes: int=field(init=False, repr=False, default=0)
+    _dropped: int=field(init=False, repr=False, default=0)
+    _lock: threading.Lock=field(init=False, repr=False, default_factory=threading.Lock)
+    _wakeup: threading.Event=field(init=False, repr=False, default_factory=threading.Event)
+    _closed: bool=field(init=False, repr=False, default=False)
+    _flusher: Optional[threading.Thread]=field(init=False, repr=False, default=None)
+    _flush_task: Optional[asyncio.Task]=field(init=False, repr=False, default=None)
+    _async_wakeup: Optional[asyncio.Event]=field(init=False, repr=False, default=None)
+    _flusher_started: bool=field(init=False, repr=False, default=False)
+    _loop: Optional[asyncio.AbstractEventLoop]=field(init=False, repr=False, default=None)
 
     @staticmethod
     def New(server_url:str, function_run_record_id:str) -> "Logger":
@@ -57,6 +92,10 @@ class Logger:
     
     def set_span_id(self, span_id: str):
         self.span_id = span_id
+
+    def set_loop(self, loop: asyncio.AbstractEventLoop):
+        """upload by async requests on loop, which must keep running till closed"""
+        self._loop = loop
     
     def info(self, msg: str):
         self.upload(LogLevel.info, msg)
@@ -85,12 +124,165 @@ class Logger:
             level=level,
             data=data,
             function_run_record_id=self.function_run_record_id)
+        metrics.inc("bloc_log_lines_total", level=level.value)
+
+        with self._lock:
+            if len(self._buffer) >= self.buffer_size:
+                dropped = self._buffer.popleft()
+                self._buffer_bytes -= self._msg_bytes(dropped)
+                self._dropped += 1
+                metrics.inc("bloc_log_dropped_lines_total")
+            msg_dict = msg.json_dict()
+            self._buffer.append(msg_dict)
+            self._buffer_bytes += self._msg_bytes(msg_dict)
+            batch_full = (
+                len(self._buffer) >= self.batch_size or
+                self._buffer_bytes >= self.batch_bytes)
+            if not self._flusher_started and not self._closed:
+                self._flusher_started = True
+                if self._loop:
+                    self._call_on_loop(self._start_flush_task)
+                else:
+                    self._flusher = threading.Thread(target=self._keep_flush, daemon=True)
+                    self._flusher.start()
+
+        if self._closed:  # no flusher anymore
+            self.flush()
+        elif batch_full:
+            self._wake_flusher()
+
+    @staticmethod
+    def _msg_bytes(msg_dict: Dict[str, Any]) -> int:
+        return len(msg_dict["data"]) + LogMsgOverheadBytes
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch, batch_bytes = [], 0
+        with self._lock:
+            if self._dropped:
+                batch.append(LogMsg(
+                    level=LogLevel.warning,
+                    data=f"{self._dropped} log lines dropped as log buffer is full",
+                    function_run_record_id=self.function_run_record_id).json_dict())
+                self._dropped = 0
+            while self._buffer and len(batch) < self.batch_size:
+                msg_bytes = self._msg_bytes(self._buffer[0])
+                if batch and batch_bytes + msg_bytes > self.batch_bytes:
+                    break
+                batch.append(self._buffer.popleft())
+                batch_bytes += msg_bytes
+                self._buffer_bytes -= msg_bytes
+        return batch
 
-        _, err = sync_post_to_server(
-            path.join(self._server_url, LogReportPath),
-            data={"logs": [msg.json_dict()]},
+    def _upload_args(self, batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        metrics.inc(
+            "bloc_log_upload_bytes_total",
+            sum(self._msg_bytes(i) for i in batch))
+        return dict(
+            url=path.join(self._server_url, LogReportPath),
+            data={"logs": batch},
             headers={
                 "trace_id": self.trace_id,
-                "span_id": self.span_id}
-        )
-        return err
+                "span_id": self.span_id})
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _call_on_loop(self, func):
+        if self._on_loop():
+            func()
+            return
+        try:
+            self._loop.call_soon_threadsafe(func)
+        except RuntimeError:  # loop closed, close() uploads the rest
+            pass
+
+    def _start_flush_task(self):
+        if self._closed:
+            return
+        self._async_wakeup = asyncio.Event()
+        self._flush_task = self._loop.create_task(self._async_keep_flush())
+
+    def _wake_flusher(self):
+        if self._loop:
+            self._call_on_loop(self._set_async_wakeup)
+        else:
+            self._wakeup.set()
+
+    def _set_async_wakeup(self):
+        if self._async_wakeup:
+            self._async_wakeup.set()
+
+    def flush(self) -> Optional[Exception]:
+        """upload all buffered log lines, return the last upload error"""
+        if self._loop and self._loop.is_running() and not self._on_loop():
+            try:
+                return asyncio.run_coroutine_threadsafe(
+                    self.async_flush(), self._loop).result()
+            except CancelledError as e:  # loop is shutting down
+                return e
+        err = None
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return err
+            _, batch_err = sync_post_to_server(**self._upload_args(batch))
+            err = batch_err or err
+
+    async def async_flush(self) -> Optional[Exception]:
+        err = None
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return err
+            _, batch_err = await post_to_server(**self._upload_args(batch))
+            err = batch_err or err
+
+    def _keep_flush(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    async def _async_keep_flush(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._async_wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._async_wakeup.clear()
+            await self.async_flush()
+
+    def _stop_flusher(self):
+        with self._lock:
+            self._closed = True
+            flusher, self._flusher = self._flusher, None
+        if flusher:
+            self._wakeup.set()
+            flusher.join()
+
+    def close(self) -> Optional[Exception]:
+        """stop background flushing and upload the rest log lines"""
+        if self._loop and self._loop.is_running() and not self._on_loop():
+            try:
+                return asyncio.run_coroutine_threadsafe(
+                    self.async_close(), self._loop).result()
+            except CancelledError as e:  # loop is shutting down
+                return e
+        self._stop_flusher()
+        return self.flush()
+
+    async def async_close(self) -> Optional[Exception]:
+        with self._lock:
+            self._closed = True
+            flush_task, self._flush_task = self._flush_task, None
+        if flush_task:
+            # it ends after the upload in progress, which isn't cut off
+            self._set_async_wakeup()
+            await flush_task
+        if self._flusher:
+            # it may be waiting for this loop, join it off the loop
+            await asyncio.get_running_loop().run_in_executor(None, self._stop_flusher)
+        return await self.async_flush()
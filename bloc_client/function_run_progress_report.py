@@ -1,10 +1,13 @@
+import time
 from os import path
 from typing import Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from bloc_client.internal.http_util import sync_post_to_server
+from bloc_client.internal.http_util import post_to_server, sync_post_to_server
+from bloc_client.function_run_report_outbox import FunctionRunReportOutbox
 
 FuncRunProgressReportPath = "report_progress"
+ProgressReportMinInterval = 1.0  # seconds
 
 
 @dataclass
@@ -16,7 +19,8 @@ class HighReadableFunctionRunProgress:
     @property
     def to_server_dict(self):
         resp = {}
-        if not any([self.progress_milestone_index, self.progress_percent, self.msg]):
+        # milestone index 0 is a milestone too
+        if not any([self.progress_milestone_index is not None, self.progress_percent, self.msg]):
             return resp
         if self.progress_percent:
             resp['progress'] = self.progress_percent
@@ -48,3 +52,107 @@ def report_function_run_high_readable_progress(
         }
     )
     return err
+
+async def async_report_function_run_high_readable_progress(
+    trace_id: str, 
+    span_id: str,
+    server_url: str,
+    function_run_record_id: str, 
+    function_run_progress: HighReadableFunctionRunProgress,
+) -> Exception:
+    if not all([function_run_progress.to_server_dict, function_run_record_id]):
+        return None
+
+    data = {
+        "function_run_record_id": function_run_record_id,
+        "high_readable_run_progress": function_run_progress.to_server_dict
+    }
+    resp, err = await post_to_server(
+        server_url + path.join(FuncRunProgressReportPath),
+        data, headers= {
+            "trace_id": trace_id,
+            "span_id": span_id
+        }
+    )
+    return err
+
+
+@dataclass
+class HighReadableFunctionRunProgressReporter:
+    """coalesce a function run's progress reports, latest wins.
+    A report is sent at most every min_interval seconds, except milestone
+    index changes which are always sent at once.
+    With outbox, reports are put into it instead of waited.
+    async_flush() must be called before reporting the run finished"""
+    trace_id: str
+    span_id: str
+    server_url: str
+    function_run_record_id: str
+    min_interval: float=ProgressReportMinInterval
+    outbox: Optional[FunctionRunReportOutbox]=None
+    _pending: Optional[HighReadableFunctionRunProgress]=field(init=False, default=None)
+    _last_reported_at: float=field(init=False, default=0)
+    _last_milestone_index: Optional[int]=field(init=False, default=None)
+
+    def _merge(self, function_run_progress: HighReadableFunctionRunProgress) -> bool:
+        """merge into pending progress, return whether it should be reported at once"""
+        if self._pending is None:
+            self._pending = function_run_progress
+        else:
+            self._pending = HighReadableFunctionRunProgress(
+                progress_percent=(
+                    function_run_progress.progress_percent
+                    if function_run_progress.progress_percent is not None
+                    else self._pending.progress_percent),
+                msg=(
+                    function_run_progress.msg
+                    if function_run_progress.msg is not None
+                    else self._pending.msg),
+                progress_milestone_index=(
+                    function_run_progress.progress_milestone_index
+                    if function_run_progress.progress_milestone_index is not None
+                    else self._pending.progress_milestone_index))
+
+        milestone_index = function_run_progress.progress_milestone_index
+        return milestone_index is not None and milestone_index != self._last_milestone_index
+
+    def _take_pending(self) -> Optional[HighReadableFunctionRunProgress]:
+        function_run_progress, self._pending = self._pending, None
+        if function_run_progress is None:
+            return None
+        self._last_reported_at = time.monotonic()
+        if function_run_progress.progress_milestone_index is not None:
+            self._last_milestone_index = function_run_progress.progress_milestone_index
+        return function_run_progress
+
+    def wait_seconds(self) -> Optional[float]:
+        """how long until the pending progress is due. None if nothing pending"""
+        if self._pending is None:
+            return None
+        return max(
+            0, self._last_reported_at + self.min_interval - time.monotonic())
+
+    async def async_add(self, function_run_progress: HighReadableFunctionRunProgress):
+        if self._merge(function_run_progress):
+            await self.async_flush()
+        else:
+            await self.async_report_if_due()
+
+    async def async_report_if_due(self) -> Optional[Exception]:
+        if self.wait_seconds() == 0:
+            return await self.async_flush()
+        return None
+
+    async def async_flush(self) -> Optional[Exception]:
+        function_run_progress = self._take_pending()
+        if function_run_progress is None:
+            return None
+        report = async_report_function_run_high_readable_progress(
+            self.trace_id, self.span_id,
+            self.server_url,
+            self.function_run_record_id,
+            function_run_progress)
+        if self.outbox:
+            self.outbox.put("progress", report)
+            return None
+        return await report
@@ -1,6 +1,10 @@
 import queue
-from typing import Any, Optional
-from multiprocessing import Queue
+import pickle
+import asyncio
+from dataclasses import dataclass
+from typing import Any, List, Optional
+from multiprocessing import Queue, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
 
 from bloc_client.function_run_log import LogLevel
 from bloc_client.function_run_opt import FunctionRunOpt
@@ -9,6 +13,9 @@ from bloc_client.function_run_progress_report import HighReadableFunctionRunProg
 
 
 class FunctionRunMsgQueue:
+    # set by report_function_run_finished_opt, in the runner's process
+    opt_reported = False
+
     def __init__(self) -> None:
         self._queue = Queue()
 
@@ -16,8 +23,11 @@ class FunctionRunMsgQueue:
     def New(cls):
         return cls()
     
+    def _put(self, msg: Any):
+        self._queue.put(msg)
+
     def report_log(self, log_level:LogLevel, msg: str):
-        self._queue.put(
+        self._put(
             FunctionRunMsg(level=log_level, msg=msg)
         )
     
@@ -31,7 +41,7 @@ class FunctionRunMsgQueue:
             progress_percent, progress_milestone_index is not None, progress_high_readable_msg
         ]):
             return
-        self._queue.put(
+        self._put(
             HighReadableFunctionRunProgress(
                 progress_percent=progress_percent,
                 msg=progress_high_readable_msg,
@@ -42,7 +52,8 @@ class FunctionRunMsgQueue:
     def report_function_run_finished_opt(
         self, func_run_opt: FunctionRunOpt
     ):
-        self._queue.put(
+        self.opt_reported = True
+        self._put(
             func_run_opt
         )
     
@@ -50,4 +61,130 @@ class FunctionRunMsgQueue:
         try:
             return self._queue.get(block=block, timeout=timeout)
         except queue.Empty as err:
-            return None
\ No newline at end of file
+            return None
+
+    async def async_get(self, timeout: Optional[float]=None) -> Any:
+        """get, without blocking the running loop"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.get, True, timeout)
+
+    def release(self):
+        """free resources held for received msgs, called after the run finished"""
+        pass
+
+
+class InProcessFunctionRunMsgQueue(FunctionRunMsgQueue):
+    """a FunctionRunMsgQueue for runner in the same process as reader,
+    msgs are passed without pickling"""
+    def __init__(self) -> None:
+        self._queue = queue.Queue()
+
+
+class AsyncFunctionRunMsgQueue(FunctionRunMsgQueue):
+    """a FunctionRunMsgQueue for `async def run()` running on the same
+    event loop as reader. report_* methods never block"""
+    def __init__(self) -> None:
+        self._queue = asyncio.Queue()
+
+    def _put(self, msg: Any):
+        self._queue.put_nowait(msg)
+
+    def get(self, block: bool, timeout: Optional[int]=None) -> Any:
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    async def async_get(self, timeout: Optional[float]=None) -> Any:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+SharedMemoryMinBytes = 1024 * 1024
+
+
+@dataclass
+class _SharedMemoryMsg:
+    name: str
+    data_size: int
+    buffer_sizes: List[int]
+
+
+class SharedMemoryFunctionRunMsgQueue(FunctionRunMsgQueue):
+    """a FunctionRunMsgQueue which passes large FunctionRunOpt in shared memory.
+    When the pickled opt is at least min_bytes, it is written into a shared
+    memory block and only the block's name goes through the queue, so large
+    opt never goes through the pipe. Buffer objects like numpy.ndarray are
+    pickled out-of-band, written straight into the block and read back as
+    views on it without copying"""
+    def __init__(self, min_bytes: int=SharedMemoryMinBytes) -> None:
+        super().__init__()
+        self._min_bytes = min_bytes
+        self._attached: List[SharedMemory] = []
+        # make runner process share this process's resource tracker,
+        # or runner's own tracker would unlink the block when runner exits
+        resource_tracker.ensure_running()
+
+    @classmethod
+    def New(cls, min_bytes: int=SharedMemoryMinBytes):
+        return cls(min_bytes)
+
+    def report_function_run_finished_opt(
+        self, func_run_opt: FunctionRunOpt
+    ):
+        self.opt_reported = True
+        buffers = []
+
+        def out_of_band(buffer: pickle.PickleBuffer) -> bool:
+            try:
+                buffers.append(buffer.raw())
+            except BufferError:  # not contiguous, keep in-band
+                return True
+            return False
+
+        data = pickle.dumps(
+            func_run_opt, protocol=5, buffer_callback=out_of_band)
+        buffer_sizes = [i.nbytes for i in buffers]
+        total_size = len(data) + sum(buffer_sizes)
+        if total_size < self._min_bytes:
+            self._put(func_run_opt)
+            return
+
+        shm = SharedMemory(create=True, size=total_size)
+        try:
+            shm.buf[:len(data)] = data
+            offset = len(data)
+            for buffer in buffers:
+                shm.buf[offset:offset+buffer.nbytes] = buffer
+                offset += buffer.nbytes
+            self._put(
+                _SharedMemoryMsg(
+                    name=shm.name,
+                    data_size=len(data),
+                    buffer_sizes=buffer_sizes))
+        finally:
+            shm.close()
+
+    def get(self, block: bool, timeout: Optional[int]=None) -> Any:
+        msg = super().get(block, timeout)
+        if not isinstance(msg, _SharedMemoryMsg):
+            return msg
+
+        shm = SharedMemory(name=msg.name)
+        self._attached.append(shm)
+        buffers, offset = [], msg.data_size
+        for size in msg.buffer_sizes:
+            buffers.append(shm.buf[offset:offset+size])
+            offset += size
+        return pickle.loads(shm.buf[:msg.data_size], buffers=buffers)
+
+    def release(self):
+        for shm in self._attached:
+            try:
+                shm.close()
+            except BufferError:  # views still referenced, unmapped when they are freed
+                pass
+            shm.unlink()
+        self._attached = []
\ No newline at end of file
@@ -1,10 +1,12 @@
+import re
+import logging
 from os import path
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, List, Tuple
 from dataclasses import dataclass, field
 
 from bloc_client.function_run_opt import FunctionRunOpt
-from bloc_client.internal.http_util import syn_get_to_server, sync_post_to_server
+from bloc_client.internal.http_util import get_to_server, post_to_server, syn_get_to_server, sync_post_to_server
 
 FunctionRunRecordPath = "get_function_run_record_by_id"
 FunctionRunStartPath = "function_run_start"
@@ -29,16 +31,45 @@ class FunctionRunRecord:
     ipt: List[List[BriefAndKey]] = field(default_factory=list)
     should_be_canceled_at: Optional[datetime]=None
 
-def get_functionRunRecord_by_id(
-    server_url: str,
-    func_run_record_id: str
-) -> Tuple[FunctionRunRecord, Exception]:
-    resp, err = syn_get_to_server(
-        server_url + path.join(FunctionRunRecordPath, func_run_record_id),
-        {})
-    if err:
-        return None, err
+    @property
+    def deadline(self) -> Optional[float]:
+        """should_be_canceled_at as time.time() timestamp. None if no deadline"""
+        if not self.should_be_canceled_at:
+            return None
+        return self.should_be_canceled_at.timestamp()
+
+# server(golang) time like 2006-01-02T15:04:05.999999999+07:00 or ...Z
+_ServerTime = re.compile(
+    r'^(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:\d{2})?$')
+
+def _parse_server_time(value: Optional[str]) -> Optional[datetime]:
+    """None if value is empty or golang's zero time.
+    also None for a time not understood, which is logged"""
+    if not value:
+        return None
+    match = _ServerTime.match(value.strip())
+    if not match:
+        logging.warning(f"time {value!r} from server not understood, ignored")
+        return None
+    main, fraction, zone = match.groups()
+    # datetime supports exactly microseconds
+    text = main.replace(" ", "T")
+    if fraction:
+        text += "." + fraction[1:7].ljust(6, "0")
+    if zone and zone != "Z":
+        text += zone
+    try:
+        ret = datetime.fromisoformat(text)
+    except ValueError:  # like month 13
+        logging.warning(f"time {value!r} from server not understood, ignored")
+        return None
+    if not zone or zone == "Z":
+        ret = ret.replace(tzinfo=timezone.utc)
+    if ret.year <= 1:
+        return None
+    return ret
 
+def _parse_function_run_record(resp: dict) -> Tuple[FunctionRunRecord, Exception]:
     try:
         ipts = []
         function_run_record = FunctionRunRecord(
@@ -48,9 +79,9 @@ def get_functionRunRecord_by_id(
             flow_run_record_id=resp['flow_function_id'],
             canceled=resp.get('canceled', False),
             trace_id=resp['trace_id'],
-            ipt=ipts
+            ipt=ipts,
+            should_be_canceled_at=_parse_server_time(resp.get('should_be_canceled_at')),
         )
-        # TODO 处理should_be_canceled_at字段
         for ipt in resp['ipt']:
             tmp = []
             for component in ipt:
@@ -66,6 +97,28 @@ def get_functionRunRecord_by_id(
     except Exception as e:
         return None, e
 
+def get_functionRunRecord_by_id(
+    server_url: str,
+    func_run_record_id: str
+) -> Tuple[FunctionRunRecord, Exception]:
+    resp, err = syn_get_to_server(
+        server_url + path.join(FunctionRunRecordPath, func_run_record_id),
+        {})
+    if err:
+        return None, err
+    return _parse_function_run_record(resp)
+
+async def async_get_functionRunRecord_by_id(
+    server_url: str,
+    func_run_record_id: str
+) -> Tuple[FunctionRunRecord, Exception]:
+    resp, err = await get_to_server(
+        server_url + path.join(FunctionRunRecordPath, func_run_record_id),
+        {})
+    if err:
+        return None, err
+    return _parse_function_run_record(resp)
+
 def report_function_run_start(
     trace_id: str, 
     span_id: str,
@@ -100,3 +153,38 @@ def report_function_run_finished(
         }
     )
     return err
+
+async def async_report_function_run_start(
+    trace_id: str, 
+    span_id: str,
+    server_url: str,
+    function_run_record_id: str, 
+) -> Exception:
+    _, err = await post_to_server(
+        server_url + path.join(FunctionRunStartPath),
+        {"function_run_record_id": function_run_record_id},
+        headers={
+            "trace_id": trace_id,
+            "span_id": span_id
+        }
+    )
+    return err
+
+async def async_report_function_run_finished(
+    trace_id: str, 
+    span_id: str,
+    server_url: str,
+    function_run_record_id: str, 
+    function_run_opt: FunctionRunOpt,
+) -> Exception:
+    data = function_run_opt.finished_report_dict
+    data['function_run_record_id'] = function_run_record_id
+    resp, err = await post_to_server(
+        server_url + path.join(FunctionRunFinishedPath),
+        data,
+        headers={
+            "trace_id": trace_id,
+            "span_id": span_id
+        }
+    )
+    return err
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Awaitable, Optional
+
+from bloc_client.function_run_log import Logger
+
+
+class FunctionRunReportOutbox:
+    """a run's reports to server(start, progress, finished), sent one by one
+    in the order they are put by a task on the loop, so the run doesn't wait
+    for them and start always arrives before finished.
+    close() must be called when the run finished, it waits till all are sent"""
+
+    def __init__(self, logger: Logger):
+        self.logger = logger
+        self._queue: Optional[asyncio.Queue] = None
+        self._sender: Optional[asyncio.Task] = None
+
+    def put(
+        self,
+        name: str,
+        report: Awaitable[Optional[Exception]],
+        log_sent: bool=False,
+    ):
+        """report returns error of sending it, which is logged to the run's log"""
+        if self._sender is None:
+            self._queue = asyncio.Queue()
+            self._sender = asyncio.ensure_future(self._keep_send())
+        self._queue.put_nowait((name, report, log_sent))
+
+    async def _keep_send(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            try:
+                await send_report(self.logger, *item)
+            except Exception as e:
+                # or later reports would never be sent
+                self.logger.error(f"report {item[0]} raised: {e!r}")
+
+    async def close(self):
+        if self._sender is None:
+            return
+        self._queue.put_nowait(None)
+        await self._sender
+
+
+async def send_report(
+    logger: Logger,
+    name: str,
+    report: Awaitable[Optional[Exception]],
+    log_sent: bool=False,
+    outbox: Optional[FunctionRunReportOutbox]=None,
+):
+    """put report into outbox if given, or send it and wait"""
+    if outbox:
+        outbox.put(name, report, log_sent)
+        return
+    err = await report
+    if err:
+        logger.error(f"report {name} failed: {err}")
+    elif log_sent:
+        logger.info(f"report {name}")
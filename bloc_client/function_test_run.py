@@ -0,0 +1,112 @@
+import time
+import asyncio
+import inspect
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from bloc_client.function_ipt import FunctionIpt
+from bloc_client.function_run_opt import FunctionRunOpt
+from bloc_client.function_interface import FunctionInterface
+from bloc_client.function_run_queue import InProcessFunctionRunMsgQueue
+
+
+@dataclass
+class FunctionTestRunResult:
+    """one run of BlocClient.test_run_function_batch.
+    peak_memory_bytes is the peak of python allocations traced by tracemalloc,
+    0 if memory is not measured"""
+    opt: Optional[FunctionRunOpt]
+    wall_seconds: float
+    cpu_seconds: float
+    peak_memory_bytes: int
+    error: str=""
+
+
+def new_test_run_ipts(
+    user_func: FunctionInterface,
+    params: List[List[Any]],
+) -> List[FunctionIpt]:
+    ipts = user_func.ipt_config()
+    for ipt_index, ipt in enumerate(ipts):
+        must = ipts[ipt_index].must
+        if must:
+            if len(params) - 1 < ipt_index:
+                raise Exception(
+                    f"index {ipt_index} is a cannot be nil ipt, but params has no this data")
+            if len(params[ipt_index]) < len(ipts[ipt_index].components):
+                raise Exception(
+                    f"index {ipt_index} need {len(ipts[ipt_index].components)} component value, "
+                    f"but param only provide {len(params[ipt_index])} value"
+                )
+
+        if ipt_index >= len(params): break
+        for component_index, _ in enumerate(ipt.components):
+            if component_index >= len(params[ipt_index]):
+                ipts[ipt_index].components[component_index].value = None
+            else:
+                ipts[ipt_index].components[component_index].value = params[ipt_index][component_index]
+    return ipts
+
+
+def _last_opt(q: InProcessFunctionRunMsgQueue) -> Optional[FunctionRunOpt]:
+    opt = None
+    while True:
+        msg = q.get(block=False)
+        if msg is None:
+            return opt
+        if isinstance(msg, FunctionRunOpt):
+            opt = msg
+
+
+def _run(user_func: FunctionInterface, ipts: List[FunctionIpt], q: InProcessFunctionRunMsgQueue):
+    if inspect.iscoroutinefunction(user_func.run):
+        asyncio.run(user_func.run(ipts, q))
+    else:
+        user_func.run(ipts, q)
+
+
+def measure_test_run(
+    user_func: FunctionInterface,
+    params: List[List[Any]],
+    measure_memory: bool=False,
+) -> FunctionTestRunResult:
+    """run user_func inline with params and measure it. Times are of a run
+    without tracemalloc, which slows python code down a lot. With
+    measure_memory, the peak memory is of another run under tracemalloc,
+    so user_func runs twice"""
+    q = InProcessFunctionRunMsgQueue.New()
+    error, peak = "", 0
+    try:
+        ipts = new_test_run_ipts(user_func, params)
+    except Exception as e:
+        return FunctionTestRunResult(
+            opt=None, wall_seconds=0, cpu_seconds=0, peak_memory_bytes=0,
+            error=f"build ipts failed: {e!r}")
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        _run(user_func, ipts, q)
+    except Exception as e:
+        error = f"function run raised exception: {e!r}"
+    wall_seconds = time.perf_counter() - wall_start
+    cpu_seconds = time.process_time() - cpu_start
+
+    opt = _last_opt(q)
+    if opt is None and not error:
+        error = "function run returned without reporting opt"
+    if measure_memory and not error:
+        ipts = new_test_run_ipts(user_func, params)
+        tracemalloc.start()
+        try:
+            _run(user_func, ipts, InProcessFunctionRunMsgQueue.New())
+        except Exception:
+            pass  # ran fine just now, only the peak is wanted
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return FunctionTestRunResult(
+        opt=opt,
+        wall_seconds=wall_seconds,
+        cpu_seconds=cpu_seconds,
+        peak_memory_bytes=peak,
+        error=error)
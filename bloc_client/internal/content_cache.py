@@ -0,0 +1,162 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bloc_client.internal.metrics import metrics
+
+
+@dataclass
+class ContentCache:
+    """cache of immutable contents by key.
+    Memory tier is a LRU bounded by memory_bytes. Disk tier is optional
+    (disk_dir not empty), bounded by disk_bytes and evicts least recently
+    used files first. Disk tier can be shared by processes on same machine.
+    0 bytes disables that tier. Hits, misses and evictions are counted in
+    metrics, which workers hand over to the pool process"""
+    memory_bytes: int = 0
+    disk_dir: str = ""
+    disk_bytes: int = 0
+    _memory: "OrderedDict[str, bytes]" = field(init=False, repr=False, default_factory=OrderedDict)
+    _memory_used: int = field(init=False, repr=False, default=0)
+    _disk_used: Optional[int] = field(init=False, repr=False, default=None)
+    # lazy ipt prefetch threads of a run use it at the same time
+    _lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        if hasattr(os, "register_at_fork"):
+            # or a worker forked while another thread holds it would deadlock
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # lock can't be pickled, like when sent to workers started by spawn
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self.__post_init__()
+
+    @property
+    def disk_enabled(self) -> bool:
+        return bool(self.disk_dir) and self.disk_bytes > 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                metrics.inc("bloc_ipt_cache_hits_total", tier="memory")
+                return data
+
+            data = self._disk_get(key)
+            if data is not None:
+                metrics.inc("bloc_ipt_cache_hits_total", tier="disk")
+                self._memory_put(key, data)
+                return data
+
+            metrics.inc("bloc_ipt_cache_misses_total")
+            return None
+
+    def put(self, key: str, data: bytes):
+        with self._lock:
+            self._memory_put(key, data)
+            self._disk_put(key, data)
+
+    def _memory_put(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= len(old)
+        self._memory[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            metrics.inc("bloc_ipt_cache_evictions_total", tier="memory")
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(
+            self.disk_dir, hashlib.sha256(key.encode()).hexdigest())
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.disk_enabled:
+            return None
+        file_path = self._disk_path(key)
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            os.utime(file_path)  # mark as recently used
+        except OSError:
+            return None
+        return data
+
+    def _disk_put(self, key: str, data: bytes):
+        if not self.disk_enabled or len(data) > self.disk_bytes:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            # write then rename, so other processes never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError:
+            return
+
+        if self._disk_used is None:
+            self._disk_used = self._scan_disk_used()
+        else:
+            self._disk_used += len(data)
+        if self._disk_used > self.disk_bytes:
+            self._disk_evict()
+
+    def _disk_files(self):
+        try:
+            return [
+                i for i in os.scandir(self.disk_dir)
+                if i.is_file() and not i.name.endswith(".tmp")]
+        except OSError:
+            return []
+
+    def _scan_disk_used(self) -> int:
+        used = 0
+        for i in self._disk_files():
+            try:
+                used += i.stat().st_size
+            except OSError:
+                pass
+        return used
+
+    def _disk_evict(self):
+        # other processes may also write to the dir, so rescan to get the truth
+        files = []
+        for i in self._disk_files():
+            try:
+                stat = i.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, i.path))
+        files.sort()
+
+        used = sum(size for _, size, _ in files)
+        for _, size, file_path in files:
+            if used <= self.disk_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            else:
+                metrics.inc("bloc_ipt_cache_evictions_total", tier="disk")
+            used -= size
+        self._disk_used = used
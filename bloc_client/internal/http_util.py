@@ -1,18 +1,188 @@
+import os
+import re
+import atexit
+import time
+import asyncio
+import logging
+import functools
+import threading
 from dataclasses import dataclass
-from typing import Dict, Optional, Any, Tuple
+from typing import BinaryIO, Callable, Dict, Optional, Any, Tuple
 
 import httpx
+from httpx._client import ClientState
+
+from bloc_client.internal.metrics import metrics
+from bloc_client.internal.tracing import tracer
+from bloc_client.internal.resp_stream import Base64DataExtractor
 
 SucCode = 200
-transport = httpx.AsyncHTTPTransport(
-    retries=3,
-    limits=httpx.Limits(max_connections=20, max_keepalive_connections=8)
-)
-client = httpx.AsyncClient(timeout=20, transport=transport)
-sync_client = httpx.Client(timeout=20, transport=httpx.HTTPTransport(
-    retries=3,
-    limits=httpx.Limits(max_connections=20, max_keepalive_connections=8)
-))
+# resp bodies and data at least this big are parsed/decoded in the default
+# executor, so the loop keeps serving other runs meanwhile
+OffloadMinBytes = 256 * 1024
+
+
+@dataclass
+class HttpPoolConfig:
+    """connection pool of each process's http clients to bloc-server.
+    keepalive_expiry: seconds an idle connection is kept for the next request"""
+    max_connections: int=20
+    max_keepalive_connections: int=8
+    keepalive_expiry: float=5.0
+    timeout: float=20.0
+    retries: int=3
+    http2: bool=False
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry)
+
+
+_pool_config = HttpPoolConfig()
+# clients are made lazily by the process using them and kept for later
+# requests of it. async client's connections belong to the loop which made
+# them, can't be reused from another one
+client: Optional[httpx.AsyncClient] = None
+_client_loop = None
+sync_client: Optional[httpx.Client] = None
+_sync_client_lock = threading.Lock()
+# aclose of replaced clients in progress, or their tasks could be collected
+_closing = set()
+
+def set_pool_config(pool_config: HttpPoolConfig):
+    """for clients made after it, in this process and processes forked later.
+    http2: async requests go over HTTP/2, concurrent requests are multiplexed
+    on a few connections. bloc-server is plain http, so it must accept
+    HTTP/2 without TLS(h2c)"""
+    global _pool_config, client, _client_loop, sync_client
+    _pool_config = pool_config
+    if client is not None:
+        _close_client(client, _client_loop)
+    if sync_client is not None:
+        sync_client.close()
+    client, _client_loop, sync_client = None, None, None
+
+async def _aclose_quietly(old_client: httpx.AsyncClient):
+    try:
+        await old_client.aclose()
+    except Exception as e:
+        logging.warning(f"close replaced http client failed: {e}")
+
+def _disown(old_client: Any):
+    """mark a client closed without touching it's connections, it's never
+    closed(nor warned about being unclosed) and sockets are freed with it"""
+    old_client._state = ClientState.CLOSED
+
+def _close_client(old_client: httpx.AsyncClient, old_loop):
+    """aclose a replaced async client without waiting for it. on it's own loop
+    if that's still running, requests there may be still using it"""
+    if old_loop is None or old_loop.is_closed():
+        # like a loop of asyncio.run() already returned, nothing to aclose on
+        _disown(old_client)
+        return
+    coro = _aclose_quietly(old_client)
+    if old_loop.is_running():
+        asyncio.run_coroutine_threadsafe(coro, old_loop)
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        old_loop.run_until_complete(coro)
+        return
+    task = loop.create_task(coro)
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+def _get_client() -> httpx.AsyncClient:
+    global client, _client_loop
+    loop = asyncio.get_running_loop()
+    if client is None or _client_loop is not loop:
+        if client is not None:
+            _close_client(client, _client_loop)
+        client = httpx.AsyncClient(
+            timeout=_pool_config.timeout,
+            transport=httpx.AsyncHTTPTransport(
+                # no TLS to negotiate http2 with, so it's http2 only
+                http1=not _pool_config.http2,
+                http2=_pool_config.http2,
+                retries=_pool_config.retries,
+                limits=_pool_config.limits,
+            )
+        )
+        _client_loop = loop
+    return client
+
+def _get_sync_client() -> httpx.Client:
+    global sync_client
+    with _sync_client_lock:
+        if sync_client is None:
+            sync_client = httpx.Client(
+                timeout=_pool_config.timeout,
+                transport=httpx.HTTPTransport(
+                    retries=_pool_config.retries,
+                    limits=_pool_config.limits,
+                )
+            )
+        return sync_client
+
+def _reset_clients_after_fork():
+    # connections inherited from parent process are still used by parent,
+    # so they are disowned, not closed. child makes it's own when needed
+    global client, _client_loop, sync_client, _sync_client_lock
+    for inherited in (client, sync_client):
+        if inherited is not None:
+            _disown(inherited)
+    client, _client_loop, sync_client = None, None, None
+    _sync_client_lock = threading.Lock()
+
+def _close_clients_at_exit():
+    # the last clients made are still kept here
+    if client is not None:
+        _close_client(client, _client_loop)
+    if sync_client is not None:
+        sync_client.close()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+atexit.register(_close_clients_at_exit)
+
+async def offload_if_large(size: int, func: Callable[..., Any], *args: Any) -> Any:
+    """func(*args) in the default executor if size is at least OffloadMinBytes,
+    or right here if it's quick enough for the loop"""
+    if size < OffloadMinBytes:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+_ApiOfUrl = re.compile(r'/api/v\d+/client/([^/?]+)')
+
+def _record_request(url: str, start: float, err: Optional[Exception]):
+    # label by api name, not url which has ids in it
+    match = _ApiOfUrl.search(url)
+    api = match.group(1) if match else "other"
+    metrics.observe("bloc_http_request_seconds", time.perf_counter() - start, api=api)
+    metrics.inc("bloc_http_requests_total", api=api, result="error" if err else "ok")
+
+def _instrumented(func):
+    """record latency and result of func(url, ...) which returns (data, err)"""
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(url: str, *args, **kwargs):
+            start = time.perf_counter()
+            ret = await func(url, *args, **kwargs)
+            _record_request(url, start, ret[1])
+            return ret
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(url: str, *args, **kwargs):
+        start = time.perf_counter()
+        ret = func(url, *args, **kwargs)
+        _record_request(url, start, ret[1])
+        return ret
+    return wrapper
 
 def _complete_url(url: str) -> str:
     if not url.startswith("http"):
@@ -27,35 +197,74 @@ class ServerResp:
     data: Any
     trace_id: str
 
+@_instrumented
 async def get_to_server(
         url: str,
         params: dict,
         headers: Optional[Dict[str, str]]=None,
 ) -> Tuple[Any, Optional[Exception]]:
     try:
-        resp = await client.get(
+        resp = await _get_client().get(
             _complete_url(url),
             params=params,
             headers=headers)
+        tracer.add_to_span(response_bytes=len(resp.content))
         if resp.status_code != SucCode:
             return None, Exception(f"failed with status_code {resp.status_code}")
-        resp = ServerResp(**resp.json())
+        resp = ServerResp(**(await offload_if_large(len(resp.content), resp.json)))
     except Exception as e:
         return None, e
     if resp.status_code != SucCode:
         return None, Exception(resp.status_msg)
     return resp.data, None
 
+@_instrumented
+async def stream_get_to_server(
+        url: str,
+        params: dict,
+        file: BinaryIO,
+        headers: Optional[Dict[str, str]]=None,
+) -> Tuple[int, Optional[Exception]]:
+    """like get_to_server, but resp data(base64 string) is decoded into file
+    while receiving. return decoded bytes count"""
+    try:
+        async with _get_client().stream(
+            "GET", _complete_url(url),
+            params=params,
+            headers=headers,
+        ) as resp:
+            if resp.status_code != SucCode:
+                return 0, Exception(f"failed with status_code {resp.status_code}")
+            extractor = Base64DataExtractor(file)
+            # received chunks are decoded and written in batches
+            pending, pending_bytes = [], 0
+            async for chunk in resp.aiter_bytes():
+                tracer.add_to_span(response_bytes=len(chunk))
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+                if pending_bytes >= OffloadMinBytes:
+                    await offload_if_large(pending_bytes, extractor.feed, b"".join(pending))
+                    pending, pending_bytes = [], 0
+            extractor.feed(b"".join(pending))
+        resp = ServerResp(**extractor.finish())
+    except Exception as e:
+        return 0, e
+    if resp.status_code != SucCode:
+        return 0, Exception(resp.status_msg)
+    return extractor.data_bytes, None
+
+@_instrumented
 def syn_get_to_server(
         url: str,
         params: dict,
         headers: Optional[Dict[str, str]]=None,
 ) -> Tuple[Any, Optional[Exception]]:
     try:
-        resp = sync_client.get(
+        resp = _get_sync_client().get(
             _complete_url(url),
             params=params,
             headers=headers)
+        tracer.add_to_span(response_bytes=len(resp.content))
         if resp.status_code != SucCode:
             return None, Exception(f"failed with status_code {resp.status_code}")
         resp = ServerResp(**resp.json())
@@ -65,13 +274,16 @@ def syn_get_to_server(
         return None, Exception(resp.status_msg)
     return resp.data, None
 
+@_instrumented
 async def post_to_server(
         url: str,
         data: dict,
         headers: Optional[Dict[str, str]]=None,
 ) -> Tuple[Any, Optional[Exception]]:
     try:
-        resp = await client.post(_complete_url(url), json=data, headers=headers)
+        resp = await _get_client().post(_complete_url(url), json=data, headers=headers)
+        tracer.add_to_span(
+            request_bytes=len(resp.request.content), response_bytes=len(resp.content))
         if resp.status_code != SucCode:
             return None, Exception(f"failed with status_code {resp.status_code}")
         if not resp.content:
@@ -81,14 +293,17 @@ async def post_to_server(
         return None, e
     return resp.data, None
 
+@_instrumented
 def sync_post_to_server(
         url: str,
         data: dict,
         headers: Optional[Dict[str, str]]=None,
 ) -> Tuple[Any, Optional[Exception]]:
     try:
-        resp = sync_client.post(
+        resp = _get_sync_client().post(
             _complete_url(url), json=data, headers=headers)
+        tracer.add_to_span(
+            request_bytes=len(resp.request.content), response_bytes=len(resp.content))
         if resp.status_code != SucCode:
             return None, Exception(f"failed with status_code {resp.status_code}")
         if not resp.content:
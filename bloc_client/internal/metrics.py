@@ -0,0 +1,217 @@
+import os
+import time
+import bisect
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# seconds
+DefaultBuckets = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# name: (type, help)
+MetricInfos: Dict[str, Tuple[str, str]] = {
+    "bloc_function_run_phase_seconds": (
+        "histogram", "seconds of each phase of a function run"),
+    "bloc_function_runs_total": (
+        "counter", "finished function runs by result"),
+    "bloc_function_run_queue_wait_seconds": (
+        "histogram", "seconds from run msg delivered to client to the run begins"),
+    "bloc_http_requests_total": (
+        "counter", "requests to bloc-server by api and result"),
+    "bloc_http_request_seconds": (
+        "histogram", "seconds of requests to bloc-server by api"),
+    "bloc_log_lines_total": (
+        "counter", "function run log lines by level"),
+    "bloc_log_dropped_lines_total": (
+        "counter", "function run log lines dropped as log buffer is full"),
+    "bloc_log_upload_bytes_total": (
+        "counter", "bytes of function run logs uploaded"),
+    "bloc_consumer_deliveries_total": (
+        "counter", "run msgs delivered to client"),
+    "bloc_consumer_requeued_total": (
+        "counter", "sync run msgs requeued as all workers are busy"),
+    "bloc_consumer_running_runs": (
+        "gauge", "function runs being executed"),
+    "bloc_spans_exported_total": (
+        "counter", "spans exported to the span sink by result"),
+    "bloc_spans_dropped_total": (
+        "counter", "spans dropped as span buffer is full"),
+    "bloc_ipt_cache_hits_total": (
+        "counter", "ipt data read from ipt cache by tier"),
+    "bloc_ipt_cache_misses_total": (
+        "counter", "ipt data not in ipt cache, downloaded from server"),
+    "bloc_ipt_cache_evictions_total": (
+        "counter", "ipt data evicted from ipt cache by tier"),
+}
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, str]) -> _Key:
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Metrics:
+    """process local counters, gauges and histograms.
+    Worker processes take() what they recorded and the pool process merge() it,
+    so the pool process has the numbers of all of them"""
+
+    def __init__(self, buckets: Tuple[float, ...]=DefaultBuckets):
+        self.buckets = buckets
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, float] = {}
+        self._gauges: Dict[_Key, float] = {}
+        # bucket counts(not cumulative) + [sum, count]
+        self._histograms: Dict[_Key, List[float]] = {}
+
+    def inc(self, name: str, value: float=1, **labels: str):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 3)
+            histogram[bisect.bisect_left(self.buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """observe seconds the with block takes, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def take(self) -> Optional[dict]:
+        """return counters and histograms recorded since last take and clear them.
+        None if nothing recorded"""
+        with self._lock:
+            if not self._counters and not self._histograms:
+                return None
+            taken = {"counters": self._counters, "histograms": self._histograms}
+            self._counters, self._histograms = {}, {}
+        return taken
+
+    def merge(self, taken: Optional[dict]):
+        if not taken:
+            return
+        with self._lock:
+            for key, value in taken["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in taken["histograms"].items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = list(values)
+                    continue
+                for index, value in enumerate(values):
+                    histogram[index] += value
+
+    def exposition(self) -> str:
+        """prometheus text format"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines = []
+        names = sorted({k[0] for k in counters} | {k[0] for k in gauges} | {k[0] for k in histograms})
+        for name in names:
+            metric_type, help = MetricInfos.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for values in (counters, gauges):
+                for (metric_name, labels), value in sorted(values.items()):
+                    if metric_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for (metric_name, labels), histogram in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), histogram):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels + (('le', le),))} {_format_value(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {_format_value(histogram[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, file_path: str):
+        """for node_exporter's textfile collector. written then renamed,
+        so the collector never reads a partial file"""
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.exposition())
+        os.replace(tmp_path, file_path)
+
+
+metrics = Metrics()
+
+
+async def _handle_metrics_request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass  # headers
+        parts = request_line.decode(errors="ignore").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", metrics.exposition().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host: str, port: int):
+    """serve GET /metrics in prometheus text format on the running loop"""
+    server = await asyncio.start_server(_handle_metrics_request, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def keep_write_textfile(file_path: str, interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        await loop.run_in_executor(None, metrics.write_textfile, file_path)
+        await asyncio.sleep(interval)
+
+if hasattr(os, "register_at_fork"):
+    # or a forked worker would report again what the parent recorded
+    os.register_at_fork(after_in_child=metrics.reset)
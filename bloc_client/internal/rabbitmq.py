@@ -1,4 +1,5 @@
-from typing import Any
+from functools import partial
+from typing import Any, Callable, Optional
 from dataclasses import dataclass, field
 
 import pika
@@ -13,6 +14,8 @@ class RabbitMQ:
     host: str
     port: int
     v_host: str
+    prefetch_count: int = 1
+    connection: Any = field(init=False)
     channel: Any = field(init=False)
 
     def __post_init__(self):
@@ -26,9 +29,10 @@ class RabbitMQ:
         )
 
         channel = connection.channel()
-        channel.basic_qos(prefetch_count=1)
+        channel.basic_qos(prefetch_count=self.prefetch_count)
         channel.exchange_declare(exchange=ExchangeName, exchange_type='topic', durable=True)
 
+        self.connection = connection
         self.channel = channel
     
     def consume_prepare(
@@ -39,3 +43,30 @@ class RabbitMQ:
         self.channel.exchange_declare(exchange=ExchangeName, exchange_type='topic', durable=True)
         self.channel.queue_declare(queue_name, durable=True, exclusive=False, auto_delete=False)
         self.channel.queue_bind(exchange=ExchangeName, queue=queue_name, routing_key=routing_key)
+
+    def consume(
+        self,
+        queue_name: str,
+        on_message: Callable[[int, bytes], None],
+        prefetch_count: Optional[int]=None,
+    ):
+        """push mode consume, blocks until the connection is closed.
+        should run in a dedicated thread which then owns the connection,
+        on_message(delivery_tag, body) is called in that thread"""
+        def _callback(channel, method, properties, body):
+            on_message(method.delivery_tag, body)
+
+        if prefetch_count:
+            self.channel.basic_qos(prefetch_count=prefetch_count)
+        self.channel.basic_consume(queue_name, _callback, auto_ack=False)
+        self.channel.start_consuming()
+
+    def ack(self, delivery_tag: int):
+        """thread safe ack, the real ack is done in the consuming thread"""
+        self.connection.add_callback_threadsafe(
+            partial(self.channel.basic_ack, delivery_tag))
+
+    def nack(self, delivery_tag: int, requeue: bool=True):
+        """thread safe nack, requeued msg can be delivered to other clients"""
+        self.connection.add_callback_threadsafe(
+            partial(self.channel.basic_nack, delivery_tag, requeue=requeue))
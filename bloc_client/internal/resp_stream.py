@@ -0,0 +1,67 @@
+import re
+import json
+import binascii
+from typing import Any, BinaryIO, Dict
+
+_DataFieldStart = re.compile(rb'(?<!\\)"data"\s*:\s*"')
+
+
+class Base64DataExtractor:
+    """incrementally parse a server resp like {"status_code": 200, "data": "<base64>", ...}.
+    base64 data is decoded into file chunk by chunk, the rest of resp(small) is kept
+    and parsed when finish. So a large data never exist in memory as a whole"""
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self._head = b""  # resp before data's value
+        self._tail = b""  # resp after data's value
+        self._pending = b""  # base64 chars can't be decoded yet(not multiple of 4)
+        self._in_data = False
+        self._data_done = False
+        self.data_bytes = 0
+
+    def feed(self, chunk: bytes):
+        if self._data_done:
+            self._tail += chunk
+            return
+        if not self._in_data:
+            self._head += chunk
+            match = _DataFieldStart.search(self._head)
+            if not match:
+                return
+            chunk = self._head[match.end():]
+            self._head = self._head[:match.end()]
+            self._in_data = True
+
+        end = chunk.find(b'"')
+        if end != -1:
+            self._tail = chunk[end:]
+            chunk = chunk[:end]
+            self._data_done = True
+        self._write_base64(chunk)
+
+    def _write_base64(self, chunk: bytes):
+        chunk = self._pending + chunk
+        decodable = len(chunk) - len(chunk) % 4
+        self._pending = chunk[decodable:]
+        if decodable:
+            decoded = binascii.a2b_base64(chunk[:decodable])
+            self._file.write(decoded)
+            self.data_bytes += len(decoded)
+
+    def finish(self) -> Dict[str, Any]:
+        """return the resp without data. raise if resp is not valid"""
+        if self._in_data and not self._data_done:
+            raise ValueError("resp ended inside data")
+        if self._pending:
+            raise ValueError("invalid base64 data")
+        if self._in_data:
+            return json.loads(self._head + self._tail)
+
+        # data isn't a string, like null
+        resp = json.loads(self._head)
+        data = resp.pop("data", None)
+        if data is not None:
+            raise ValueError(f"data should be base64 string, got {type(data).__name__}")
+        resp["data"] = None
+        return resp
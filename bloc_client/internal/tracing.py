@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from bloc_client.internal.metrics import metrics
+from bloc_client.internal.gen_uuid import new_uuid
+
+# finished spans kept till exported, the oldest are dropped beyond it
+SpanBufferSize = 10000
+
+
+@dataclass
+class Span:
+    """one phase of a function run. times are time.time()"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str
+    start_time: float
+    end_time: float=0
+    attributes: Dict[str, Any]=field(default_factory=dict)
+    error: str=""
+
+    @property
+    def duration(self) -> float:
+        return self.end_time - self.start_time
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar(
+    "bloc_client_current_span", default=None)
+
+
+class Tracer:
+    """process local buffer of finished spans. Like metrics, worker processes
+    take() their spans and the pool process extend() it's buffer with them,
+    where they are exported. Records nothing unless enabled"""
+
+    def __init__(self, max_spans: int=SpanBufferSize):
+        self.enabled = False
+        self.max_spans = max_spans
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._spans: Deque[Span] = deque()
+
+    def extend(self, spans: Optional[List[Span]]):
+        if not spans:
+            return
+        with self._lock:
+            self._spans.extend(spans)
+            dropped = len(self._spans) - self.max_spans
+            for _ in range(dropped):
+                self._spans.popleft()
+        if dropped > 0:
+            metrics.inc("bloc_spans_dropped_total", dropped)
+
+    def take(self) -> List[Span]:
+        with self._lock:
+            spans, self._spans = list(self._spans), deque()
+        return spans
+
+    def record(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: str,
+        start_time: float,
+        end_time: Optional[float]=None,
+        attributes: Optional[Dict[str, Any]]=None,
+        span_id: str="",
+        error: str="",
+    ):
+        """record a span already finished(end_time None is now)"""
+        if not self.enabled:
+            return
+        self.extend([Span(
+            name=name,
+            trace_id=trace_id,
+            span_id=span_id or new_uuid(),
+            parent_span_id=parent_span_id,
+            start_time=start_time,
+            end_time=end_time or time.time(),
+            attributes=attributes or {},
+            error=error)])
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: str,
+        attributes: Optional[Dict[str, Any]]=None,
+    ) -> Iterator[Optional[Span]]:
+        """record the with block as a span. add_to_span() in the block, and in
+        tasks started from it, adds to this span"""
+        if not self.enabled:
+            yield None
+            return
+        span = Span(
+            name=name,
+            trace_id=trace_id,
+            span_id=new_uuid(),
+            parent_span_id=parent_span_id,
+            start_time=time.time(),
+            attributes=dict(attributes or {}))
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time = time.time()
+            self.extend([span])
+
+    def add_to_span(self, **values: float):
+        """add values to the current span's attributes of the same keys,
+        like bytes of each request made in it"""
+        span = _current_span.get()
+        if span is None:
+            return
+        for key, value in values.items():
+            span.attributes[key] = span.attributes.get(key, 0) + value
+
+
+tracer = Tracer()
+
+
+def export_spans(sink: Any, spans: List[Span], batch_size: int):
+    for i in range(0, len(spans), batch_size):
+        batch = spans[i:i + batch_size]
+        err = sink.export(batch)
+        if err:
+            logging.warning(f"export {len(batch)} spans failed: {err}")
+        metrics.inc(
+            "bloc_spans_exported_total", len(batch), result="error" if err else "ok")
+
+
+async def keep_export_spans(sink: Any, interval: float, batch_size: int):
+    """export finished spans to sink every interval seconds, the rest are
+    exported when cancelled"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            spans = tracer.take()
+            if spans:
+                await loop.run_in_executor(
+                    None, export_spans, sink, spans, batch_size)
+    finally:
+        export_spans(sink, tracer.take(), batch_size)
+
+if hasattr(os, "register_at_fork"):
+    # or a forked worker would export again what the parent recorded
+    os.register_at_fork(after_in_child=tracer.reset)
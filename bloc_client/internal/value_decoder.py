@@ -0,0 +1,116 @@
+import json
+from enum import Enum
+from decimal import Decimal, InvalidOperation
+from array import array
+from typing import Any, Callable, Dict
+
+from bloc_client.value_type import ValueType
+
+
+class ArrayFormat(Enum):
+    """how an int/float array ipt is given to function.
+    other value type's array is always list"""
+    list = "list"
+    array = "array"  # array.array, 8 bytes per item
+    numpy = "numpy"  # numpy.ndarray, need numpy installed
+
+
+def _decode_str(data: bytes) -> str:
+    data_in_str = data.decode()
+    if data_in_str.startswith('"'):
+        data_in_str = data_in_str[1:]
+    if data_in_str.endswith('"'):
+        data_in_str = data_in_str[:len(data_in_str)-1]
+    return data_in_str
+
+
+def _decode_int(data: bytes) -> int:
+    try:
+        return int(data)
+    except ValueError:
+        pass
+    # json numbers like 1.0 or 1e3 are also valid int as long as integral.
+    # Decimal keeps big ones exact, which float would not
+    try:
+        value = Decimal(data.decode())
+    except InvalidOperation:
+        raise ValueError(f"invalid int: {data!r}") from None
+    if not value.is_finite() or value != value.to_integral_value():
+        raise ValueError(f"invalid int: {data!r}")
+    return int(value)
+
+
+def _decode_bool(data: bytes) -> bool:
+    return False if data.decode() in ["0", "false", "False"] else True
+
+
+_scalar_decoders: Dict[ValueType, Callable[[bytes], Any]] = {
+    ValueType.strValueType: _decode_str,
+    ValueType.intValueType: _decode_int,
+    ValueType.floatValueType: float,
+    ValueType.jsonValueType: json.loads,
+    ValueType.boolValueType: _decode_bool,
+}
+
+_array_typecodes: Dict[ValueType, str] = {
+    ValueType.intValueType: "q",
+    ValueType.floatValueType: "d",
+}
+
+
+_ArrayParseChunkBytes = 64 * 1024
+
+
+def _decode_number_array(data: bytes, typecode: str) -> array:
+    # parse items straight from bytes chunk by chunk, never hold a full list of
+    # boxed numbers or split strings
+    data = data.strip()
+    if not data.startswith(b"[") or not data.endswith(b"]"):
+        raise ValueError("array data should be in [...]")
+    ret = array(typecode)
+
+    start, stop = 1, len(data) - 1
+    while start < stop:
+        end = data.find(b",", start + _ArrayParseChunkBytes, stop)
+        if end == -1:
+            end = stop
+        chunk = data[start:end]
+        if start == 1 and end == stop and not chunk.strip():  # empty array
+            break
+        items = chunk.split(b",")
+        if typecode == "d":
+            ret.extend(map(float, items))
+        else:
+            try:
+                ret.extend(array(typecode, map(int, items)))
+            except ValueError:  # not all plain ints, like 1.0
+                ret.extend(map(_decode_int, items))
+        start = end + 1
+    return ret
+
+
+def decode_value(
+    data: bytes,
+    value_type: ValueType,
+    is_array: bool,
+    array_format: ArrayFormat=ArrayFormat.list,
+) -> Any:
+    """decode object storage data to value_type's python value.
+    raise exception if data not valid"""
+    if not is_array:
+        return _scalar_decoders[value_type](data)
+
+    typecode = _array_typecodes.get(value_type)
+    if typecode is None or array_format == ArrayFormat.list:
+        data_list = json.loads(data)
+        if not isinstance(data_list, list):
+            raise ValueError(f"array data should be list, got {type(data_list).__name__}")
+        return data_list
+
+    data_array = _decode_number_array(data, typecode)
+    if array_format == ArrayFormat.numpy:
+        import numpy
+        # shares data_array's buffer, no copy
+        return numpy.frombuffer(
+            data_array, dtype=numpy.int64 if typecode == "q" else numpy.float64)
+    return data_array
@@ -0,0 +1,253 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from multiprocessing import Process, Pipe
+from typing import Any, Callable, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+# workers forked later inherit earlier workers' pipe ends, so closing the pipe
+# in pool process can't be relied on to stop a worker
+_STOP = None
+# worker tells pool about current run by (_RUN_INFO, info, deadline)
+_RUN_INFO = "__run_info__"
+# seconds after the run's deadline before the worker is terminated,
+# gives the worker a chance to cancel the run by itself
+DeadlineGraceSeconds = 10.0
+# seconds between terminate and kill
+KillGraceSeconds = 3.0
+
+
+class WorkerDeadlineExceeded(Exception):
+    """worker was killed because the run didn't finish before it's deadline.
+    info is what the worker passed to set_run_info"""
+    def __init__(self, info: Any):
+        super().__init__("run exceeded deadline, worker killed")
+        self.info = info
+
+
+class WorkerExited(Exception):
+    """worker process exited in the middle of a run, like segfault or killed
+    by OOM killer. info is what the worker passed to set_run_info, None if
+    it exited before that"""
+    def __init__(self, info: Any):
+        super().__init__("worker process exited unexpectedly")
+        self.info = info
+
+
+def _rss_mb() -> float:
+    """current resident memory of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0
+    # no procfs, fallback to peak rss. which is KB on linux and bytes on macos
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        max_rss /= 1024
+    return max_rss / 1024
+
+
+_loop = None
+_conn = None  # worker's pipe to the pool, None if not in a worker
+_retire_requested = False
+
+def run_in_worker_loop(coro):
+    """run coro to complete on this worker's long-lived event loop,
+    so that async connection pools survive between runs"""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+
+def stop_process(process: Process, grace: float=KillGraceSeconds):
+    """terminate process, then kill it if still alive grace seconds later"""
+    process.terminate()
+    process.join(timeout=grace)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def set_run_info(info: Any, deadline: Optional[float]=None):
+    """tell the pool about current run, info is given back by the exception
+    pool's submit raises if the worker dies in the run(WorkerExited).
+    With deadline(time.time()), the run should finish before it. If it doesn't
+    DeadlineGraceSeconds later, the worker is terminated and submit raises
+    WorkerDeadlineExceeded(info). No-op out of a worker"""
+    if _conn is not None:
+        _conn.send((_RUN_INFO, info, deadline))
+
+
+def retire_worker():
+    """replace this worker with a fresh one after current run, like when a
+    run left a thread which can't be stopped. No-op out of a worker"""
+    global _retire_requested
+    _retire_requested = True
+
+
+def _worker_main(
+    conn,
+    handler: Callable[..., Any],
+    max_runs: int,
+    max_memory_mb: int,
+):
+    global _conn
+    _conn = conn
+    runs = 0
+    while True:
+        try:
+            payload = conn.recv()
+        except (EOFError, OSError):
+            return
+        if payload is _STOP:
+            return
+
+        args, kwargs = payload
+        err, result = None, None
+        try:
+            result = handler(*args, **kwargs)
+        except Exception as e:
+            logging.exception("worker handle run failed")
+            err = f"{type(e).__name__}: {e}"
+        runs += 1
+
+        retire = bool(
+            _retire_requested or
+            (max_runs and runs >= max_runs) or
+            (max_memory_mb and _rss_mb() >= max_memory_mb))
+        conn.send((err, retire, result))
+        if retire:
+            return
+
+
+@dataclass(eq=False)
+class _Worker:
+    process: Process
+    conn: Any
+
+    def call(self, payload: Any) -> Tuple[Optional[str], bool, Any]:
+        self.conn.send(payload)
+        deadline, info = None, None
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, deadline + DeadlineGraceSeconds - time.time())
+            try:
+                if not self.conn.poll(timeout):
+                    stop_process(self.process)
+                    raise WorkerDeadlineExceeded(info)
+                reply = self.conn.recv()
+            except (EOFError, OSError):
+                raise WorkerExited(info)
+            if reply[0] == _RUN_INFO:
+                _, info, deadline = reply
+                continue
+            return reply
+
+    def close(self):
+        try:
+            self.conn.send(_STOP)
+        except OSError:  # already exited
+            pass
+        self.conn.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+@dataclass
+class WorkerPool:
+    """long-lived worker processes. each worker is forked once with handler
+    (and everything it references) already loaded, then receives handler's
+    args over a pipe. A worker is replaced by a fresh one after max_runs_per_worker
+    runs or when it's rss exceed max_memory_mb. 0 means no limit"""
+    handler: Callable[..., Any]
+    size: int
+    max_runs_per_worker: int = 0
+    max_memory_mb: int = 0
+    _idle: asyncio.Queue = field(init=False, repr=False)
+    _workers: set = field(init=False, repr=False, default_factory=set)
+    _waiters: Optional[ThreadPoolExecutor] = field(init=False, repr=False, default=None)
+    _closed: bool = field(init=False, repr=False, default=False)
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = Pipe()
+        process = Process(
+            target=_worker_main,
+            args=(
+                child_conn, self.handler,
+                self.max_runs_per_worker, self.max_memory_mb))
+        process.start()
+        child_conn.close()
+        worker = _Worker(process=process, conn=parent_conn)
+        self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker: _Worker):
+        self._workers.discard(worker)
+        worker.close()
+
+    def start(self):
+        self._idle = asyncio.Queue()
+        # blocking wait of worker's reply is done in these threads
+        self._waiters = ThreadPoolExecutor(max_workers=self.size)
+        for _ in range(self.size):
+            self._idle.put_nowait(self._spawn())
+
+    def shutdown(self):
+        self._closed = True
+        for worker in list(self._workers):
+            self._retire(worker)
+        if self._waiters:
+            self._waiters.shutdown(wait=False)
+
+    def __enter__(self) -> "WorkerPool":
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    async def submit(self, *args, **kwargs) -> Any:
+        """run handler(*args, **kwargs) in an idle worker, return what it returns"""
+        payload = (args, kwargs)
+        worker = await self._idle.get()
+        loop = asyncio.get_running_loop()
+        worker_lost, result = None, None
+        try:
+            err, retire, result = await loop.run_in_executor(
+                self._waiters, worker.call, payload)
+        except (EOFError, OSError):  # sending payload failed
+            worker_lost = WorkerExited(None)
+            err, retire = str(worker_lost), True
+        except (WorkerDeadlineExceeded, WorkerExited) as e:
+            worker_lost = e
+            err, retire = str(e), True
+
+        if self._closed:
+            # or the worker spawned here would be left running after shutdown
+            self._retire(worker)
+        else:
+            if retire:
+                self._retire(worker)
+                worker = self._spawn()
+            self._idle.put_nowait(worker)
+
+        if worker_lost:
+            raise worker_lost
+        if err:
+            raise Exception(err)
+        return result
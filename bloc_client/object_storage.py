@@ -1,51 +1,132 @@
-import json
+import mmap
 import base64
+import tempfile
 from os import path
-from typing import Any, Tuple
+from typing import Any, Optional, Tuple, Union
 
 from bloc_client.value_type import ValueType
-from bloc_client.internal.http_util import syn_get_to_server, sync_post_to_server
+from bloc_client.internal.tracing import tracer
+from bloc_client.internal.content_cache import ContentCache
+from bloc_client.internal.value_decoder import ArrayFormat, decode_value
+from bloc_client.internal.http_util import OffloadMinBytes, get_to_server, offload_if_large, post_to_server, stream_get_to_server, syn_get_to_server, sync_post_to_server
 
 
 ObjectStorageDataByKeyFromServerPath = "get_byte_value_by_key"
 PersistOptDataToServerPath = "persist_certain_function_run_opt_field"
 
-def get_data_by_object_storage_key(
-    server_url: str, 
-    object_storage_key: str, 
+def _decode_data(
+    data: bytes,
     value_type: ValueType,
-    is_array: bool
+    is_array: bool,
+    array_format: ArrayFormat=ArrayFormat.list,
 ) -> Tuple[Any, Exception]:
-    resp, err = syn_get_to_server(
-        server_url + path.join(
-            ObjectStorageDataByKeyFromServerPath, 
-            object_storage_key),
-        {})
-    if err:
-        return None, err
     try:
-        data_in_str = base64.b64decode(resp).decode()
-        if is_array:
-            data_list = eval(data_in_str)
-            return data_list, None
-        else:
-            if value_type == ValueType.strValueType:
-                if data_in_str.startswith('"'):
-                    data_in_str = data_in_str[1:]
-                if data_in_str.endswith('"'):
-                    data_in_str = data_in_str[:len(data_in_str)-1]
-                return data_in_str, None
-            elif value_type == ValueType.intValueType:
-                return int(data_in_str), None
-            elif value_type == ValueType.floatValueType:
-                return float(data_in_str), None
-            elif value_type == ValueType.jsonValueType:
-                return json.loads(data_in_str)
-            elif value_type == ValueType.boolValueType:
-                return False if data_in_str in ["0", "false", "False"] else True
+        return decode_value(data, value_type, is_array, array_format), None
     except Exception as e:
         return None, e
 
+def _b64decode_resp(
+    object_storage_key: str,
+    resp: Any,
+    cache: Optional[ContentCache]
+) -> Tuple[bytes, Exception]:
+    try:
+        data = base64.b64decode(resp)
+    except Exception as e:
+        return None, e
+    # object storage key's content never change, so it's safe to cache
+    if cache:
+        cache.put(object_storage_key, data)
+    return data, None
+
+def _offload_size(size: int, cache: Optional[ContentCache]) -> int:
+    """size to decide by whether to offload work touching cache, whose disk
+    tier reads & writes files whatever the size"""
+    if cache and cache.disk_enabled:
+        return max(size, OffloadMinBytes)
+    return size
+
+def get_data_by_object_storage_key(
+    server_url: str, 
+    object_storage_key: str, 
+    value_type: ValueType,
+    is_array: bool,
+    cache: Optional[ContentCache]=None,
+    array_format: ArrayFormat=ArrayFormat.list,
+) -> Tuple[Any, Exception]:
+    data = cache.get(object_storage_key) if cache else None
+    if data is not None:
+        tracer.add_to_span(cached_bytes=len(data))
+    else:
+        resp, err = syn_get_to_server(
+            server_url + path.join(
+                ObjectStorageDataByKeyFromServerPath, 
+                object_storage_key),
+            {})
+        if err:
+            return None, err
+        data, err = _b64decode_resp(object_storage_key, resp, cache)
+        if err:
+            return None, err
+    return _decode_data(data, value_type, is_array, array_format)
+
+async def async_get_data_by_object_storage_key(
+    server_url: str, 
+    object_storage_key: str, 
+    value_type: ValueType,
+    is_array: bool,
+    cache: Optional[ContentCache]=None,
+    array_format: ArrayFormat=ArrayFormat.list,
+) -> Tuple[Any, Exception]:
+    """like get_data_by_object_storage_key, large data is decoded off the loop"""
+    data = None
+    if cache:
+        data = await offload_if_large(
+            _offload_size(0, cache), cache.get, object_storage_key)
+    if data is not None:
+        tracer.add_to_span(cached_bytes=len(data))
+    else:
+        resp, err = await get_to_server(
+            server_url + path.join(
+                ObjectStorageDataByKeyFromServerPath, 
+                object_storage_key),
+            {})
+        if err:
+            return None, err
+        data, err = await offload_if_large(
+            _offload_size(len(resp or ""), cache),
+            _b64decode_resp, object_storage_key, resp, cache)
+        if err:
+            return None, err
+    return await offload_if_large(
+        len(data), _decode_data, data, value_type, is_array, array_format)
+
+async def async_get_mmap_by_object_storage_key(
+    server_url: str, 
+    object_storage_key: str,
+    tmp_dir: str="",
+) -> Tuple[Union[mmap.mmap, bytes], Exception]:
+    """stream data into a temp file in tmp_dir(system default if empty)
+    and return a read-only mmap of it, so data is never fully in memory.
+    the temp file is removed once the mmap is closed.
+    empty data is returned as b"" as it can't be mmaped"""
+    with tempfile.TemporaryFile(dir=tmp_dir or None) as f:
+        size, err = await stream_get_to_server(
+            server_url + path.join(
+                ObjectStorageDataByKeyFromServerPath, 
+                object_storage_key),
+            {},
+            f)
+        if err:
+            return None, err
+        if size == 0:
+            return b"", None
+        f.flush()
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), None
+        except Exception as e:
+            return None, e
+
 def persist_opt_to_server(
     trace_id: str, 
     span_id: str,
@@ -71,3 +152,26 @@ def persist_opt_to_server(
         return resp, None
     except Exception as e:
         return None, e
+
+async def async_persist_opt_to_server(
+    trace_id: str, 
+    span_id: str,
+    server_url: str, 
+    function_run_record_id: str, 
+    opt_key: str, opt_data: Any
+) -> Tuple[Any, Exception]:
+    data = {
+        'function_run_record_id': function_run_record_id,
+        'opt_key': opt_key,
+        'data': opt_data}
+    resp, err = await post_to_server(
+        server_url + path.join(PersistOptDataToServerPath),
+        data, 
+        headers={
+            "trace_id": trace_id,
+            "span_id": span_id
+        }
+    )
+    if err:
+        return None, err
+    return resp, None
@@ -0,0 +1,139 @@
+import io
+import os
+import random
+import pstats
+import cProfile
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+from bloc_client.function_ipt import FunctionIpt
+from bloc_client.function_run_log import LogLevel
+from bloc_client.function_run_opt import FunctionRunOpt
+from bloc_client.function_run_queue import FunctionRunMsgQueue
+
+RunProfileDir = os.path.join(tempfile.gettempdir(), "bloc_client_profiles")
+
+
+@dataclass
+class RunProfile:
+    """profile about 1 in every runs(randomly sampled) of a function.
+    cpu: cProfile, memory: tracemalloc(traces the whole runner process).
+    full results are written to dir as {function_run_record_id}.prof/.tracemalloc,
+    the top_n hotspots and allocation sites are reported to the run's log.
+    not for async functions"""
+    every: int=1
+    cpu: bool=True
+    memory: bool=False
+    top_n: int=20
+    dir: str=RunProfileDir
+
+    def sampled(self) -> bool:
+        return self.every > 0 and random.randrange(self.every) == 0
+
+
+class _OptHoldingQueue:
+    """holds run's finished opt, everything else goes to q"""
+    def __init__(self, q: FunctionRunMsgQueue):
+        self._q = q
+        self.opt: Optional[FunctionRunOpt] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._q, name)
+
+    def report_function_run_finished_opt(self, function_run_opt: FunctionRunOpt):
+        self.opt = function_run_opt
+
+
+class RunProfiler:
+    def __init__(self, profile: RunProfile, name: str):
+        self.profile = profile
+        self.name = name
+        self._cpu_profiler: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+
+    def run(
+        self,
+        run: Callable[[List[FunctionIpt], FunctionRunMsgQueue], Any],
+        ipts: List[FunctionIpt],
+        q: FunctionRunMsgQueue,
+    ):
+        """call run(ipts, q) under profiling. it's finished opt is held till the
+        profile summary is reported to q, as reader stops at the opt"""
+        held_q = _OptHoldingQueue(q)
+        self._start()
+        try:
+            run(ipts, held_q)
+        finally:
+            for msg in self._stop():
+                q.report_log(LogLevel.info, msg)
+            if held_q.opt is not None:
+                q.report_function_run_finished_opt(held_q.opt)
+
+    def _start(self):
+        if self.profile.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+        if self.profile.cpu:
+            self._cpu_profiler = cProfile.Profile()
+            self._cpu_profiler.enable()
+
+    def _stop(self) -> List[str]:
+        """stop profiling, write results to files and return their summaries"""
+        summaries = []
+        if self._cpu_profiler:
+            self._cpu_profiler.disable()
+        # snapshot before the cpu summary, or its allocations are in it
+        if self.profile.memory:
+            summaries.append(self._memory_summary())
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        if self._cpu_profiler:
+            summaries.insert(0, self._cpu_summary())
+        return summaries
+
+    def _file_path(self, suffix: str) -> str:
+        os.makedirs(self.profile.dir, exist_ok=True)
+        return os.path.join(self.profile.dir, f"{self.name}.{suffix}")
+
+    def _cpu_summary(self) -> str:
+        saved = ""
+        try:
+            file_path = self._file_path("prof")
+            self._cpu_profiler.dump_stats(file_path)
+            saved = f", full profile: {file_path}"
+        except OSError as e:
+            saved = f", save full profile failed: {e}"
+        stream = io.StringIO()
+        pstats.Stats(self._cpu_profiler, stream=stream).sort_stats(
+            "cumulative").print_stats(self.profile.top_n)
+        return (
+            f"cpu profile of run, top {self.profile.top_n} by cumulative time{saved}\n"
+            + stream.getvalue().strip())
+
+    def _memory_summary(self) -> str:
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        saved = ""
+        try:
+            file_path = self._file_path("tracemalloc")
+            snapshot.dump(file_path)
+            saved = f", full snapshot: {file_path}"
+        except OSError as e:
+            saved = f", save full snapshot failed: {e}"
+        lines = [
+            f"memory profile of run, peak {peak / 1024 / 1024:.1f}MB, "
+            f"top {self.profile.top_n} allocation sites{saved}"]
+        for stat in snapshot.statistics("lineno")[:self.profile.top_n]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"{frame.filename}:{frame.lineno}: "
+                f"{stat.size / 1024:.1f}KB in {stat.count} blocks")
+        return "\n".join(lines)
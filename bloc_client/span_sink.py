@@ -0,0 +1,127 @@
+import abc
+import json
+import string
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bloc_client.internal.tracing import Span
+
+OTLPHttpEndpoint = "http://127.0.0.1:4318/v1/traces"
+
+
+class SpanSink(metaclass=abc.ABCMeta):
+    """where spans of function runs go, set by ConfigBuilder.set_span_export.
+    export is called with batches of finished spans from a thread of the
+    client's main process"""
+
+    @abc.abstractmethod
+    def export(self, spans: List[Span]) -> Optional[Exception]:
+        raise NotImplementedError
+
+
+def _span_dict(span: Span) -> Dict[str, Any]:
+    return {
+        "name": span.name,
+        "trace_id": span.trace_id,
+        "span_id": span.span_id,
+        "parent_span_id": span.parent_span_id,
+        "start_time": span.start_time,
+        "end_time": span.end_time,
+        "duration": span.duration,
+        "attributes": span.attributes,
+        "error": span.error,
+    }
+
+
+class JsonLinesSpanSink(SpanSink):
+    """append each span as a json line to file_path"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> Optional[Exception]:
+        lines = "".join(
+            json.dumps(_span_dict(i), default=str) + "\n" for i in spans)
+        try:
+            with self._lock, open(self.file_path, "a") as f:
+                f.write(lines)
+        except OSError as e:
+            return e
+        return None
+
+
+def _otlp_id(value: str, hex_len: int) -> str:
+    """otlp ids are hex of 16(trace) or 8(span) bytes. bloc's ids are uuid
+    strings, hashed into that when they don't fit"""
+    hex_id = value.replace("-", "").lower()
+    if len(hex_id) == hex_len and all(c in string.hexdigits for c in hex_id):
+        return hex_id
+    return hashlib.sha256(value.encode()).hexdigest()[:hex_len]
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    otlp_span = {
+        "traceId": _otlp_id(span.trace_id, 32),
+        "spanId": _otlp_id(span.span_id, 16),
+        "name": span.name,
+        "kind": 1,  # internal
+        "startTimeUnixNano": str(int(span.start_time * 1e9)),
+        "endTimeUnixNano": str(int(span.end_time * 1e9)),
+        # keep bloc's ids to find the span by what bloc-server logged
+        "attributes": _otlp_attributes(dict(
+            span.attributes, **{"bloc.trace_id": span.trace_id, "bloc.span_id": span.span_id})),
+        "status": {"code": 2, "message": span.error} if span.error else {},
+    }
+    if span.parent_span_id:
+        otlp_span["parentSpanId"] = _otlp_id(span.parent_span_id, 16)
+    return otlp_span
+
+
+class OTLPHttpSpanSink(SpanSink):
+    """post spans to an OTLP/HTTP collector(json encoding), like
+    opentelemetry-collector or jaeger's http://host:4318/v1/traces"""
+
+    def __init__(
+        self,
+        endpoint: str=OTLPHttpEndpoint,
+        service_name: str="bloc_client",
+        headers: Optional[Dict[str, str]]=None,
+        timeout: float=10,
+    ):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._client = httpx.Client(timeout=timeout, headers=headers)
+
+    def export(self, spans: List[Span]) -> Optional[Exception]:
+        body = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "bloc_client"},
+                "spans": [_otlp_span(i) for i in spans],
+            }],
+        }]}
+        try:
+            resp = self._client.post(self.endpoint, json=body)
+        except Exception as e:
+            return e
+        if resp.status_code >= 300:
+            return Exception(f"failed with status_code {resp.status_code}")
+        return None
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from bloc_client import bloc_client
+from bloc_client.bloc_client import BlocClient, _acquire_within
+
+
+class _Rabbit:
+    def __init__(self):
+        self.acked, self.nacked = [], []
+
+    def ack(self, delivery_tag: int):
+        self.acked.append(delivery_tag)
+
+    def nack(self, delivery_tag: int, requeue: bool=True):
+        self.nacked.append(delivery_tag)
+
+
+class _Pool:
+    def __init__(self):
+        self.submitted = []
+
+    async def submit(self, msg_str, **kwargs):
+        self.submitted.append(msg_str)
+        return None, []
+
+
+async def _sync_function(msg_str, received_at):
+    """try_run_async of a msg whose function is sync"""
+    return False, None, None
+
+
+class TestSyncSlots(unittest.TestCase):
+    def _run_and_ack(self, sync_slots: asyncio.Semaphore):
+        pool, rabbit, slots = _Pool(), _Rabbit(), asyncio.Semaphore(2)
+
+        async def run():
+            await slots.acquire()
+            await BlocClient._run_and_ack(
+                pool, rabbit, slots, 1, b"msg", _sync_function, None, sync_slots)
+
+        asyncio.run(run())
+        return pool, rabbit, slots
+
+    def test_sync_run_takes_sync_slot(self):
+        sync_slots = asyncio.Semaphore(1)
+        pool, rabbit, slots = self._run_and_ack(sync_slots)
+        self.assertEqual(pool.submitted, ["msg"])
+        self.assertEqual(rabbit.acked, [1])
+        self.assertFalse(sync_slots.locked(), "sync slot should be released")
+        self.assertFalse(slots.locked(), "slot should be released")
+
+    def test_requeued_when_workers_busy(self):
+        sync_slots = asyncio.Semaphore(0)
+        with mock.patch.object(bloc_client, "SyncSlotWaitSeconds", 0.01):
+            pool, rabbit, slots = self._run_and_ack(sync_slots)
+        self.assertEqual(pool.submitted, [], "should not wait for a worker")
+        self.assertEqual((rabbit.acked, rabbit.nacked), ([], [1]), "should be requeued")
+        self.assertFalse(slots.locked(), "slot should be released")
+
+
+class TestAcquireWithin(unittest.TestCase):
+    def test_acquired_or_not(self):
+        async def main():
+            semaphore = asyncio.Semaphore(1)
+            self.assertTrue(await _acquire_within(semaphore, 0.01))
+            self.assertFalse(await _acquire_within(semaphore, 0.01))
+            asyncio.get_running_loop().call_later(0.01, semaphore.release)
+            self.assertTrue(await _acquire_within(semaphore, 1))
+            self.assertTrue(semaphore.locked(), "acquired once, not leaked or lost")
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
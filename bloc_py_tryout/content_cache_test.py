@@ -0,0 +1,110 @@
+import os
+import time
+import pickle
+import tempfile
+import unittest
+
+from bloc_client.internal.metrics import metrics
+from bloc_client.internal.content_cache import ContentCache
+
+
+def _counters() -> dict:
+    """ipt cache counters recorded since last call"""
+    taken = metrics.take() or {"counters": {}}
+    return {
+        (name, labels): value
+        for (name, labels), value in taken["counters"].items()
+        if name.startswith("bloc_ipt_cache_")}
+
+
+class TestContentCacheMemory(unittest.TestCase):
+    def setUp(self):
+        metrics.take()
+
+    def test_hit_and_miss(self):
+        cache = ContentCache(memory_bytes=100)
+        self.assertIsNone(cache.get("a"), "should miss")
+        cache.put("a", b"data")
+        self.assertEqual(cache.get("a"), b"data", "should hit")
+        self.assertEqual(_counters(), {
+            ("bloc_ipt_cache_misses_total", ()): 1,
+            ("bloc_ipt_cache_hits_total", (("tier", "memory"),)): 1})
+
+    def test_least_recently_used_evicted(self):
+        cache = ContentCache(memory_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        cache.get("a")  # b is the least recently used now
+        cache.put("c", b"1234")
+        self.assertIsNone(cache.get("b"), "b should be evicted")
+        self.assertEqual(cache.get("a"), b"1234", "a should be kept")
+        self.assertEqual(cache.get("c"), b"1234", "c should be kept")
+        self.assertEqual(
+            _counters()[("bloc_ipt_cache_evictions_total", (("tier", "memory"),))], 1)
+
+    def test_larger_than_memory_bytes_not_kept(self):
+        cache = ContentCache(memory_bytes=3)
+        cache.put("a", b"1234")
+        self.assertIsNone(cache.get("a"))
+
+    def test_put_same_key_again(self):
+        cache = ContentCache(memory_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        self.assertEqual(cache.get("a"), b"1234", "a's size should be counted once")
+
+    def test_pickled(self):
+        cache = ContentCache(memory_bytes=100)
+        cache.put("a", b"data")
+        # like sent to a worker started by spawn
+        copied = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(copied.get("a"), b"data")
+        copied.put("b", b"data")
+        self.assertIsNone(cache.get("b"), "copy should be on it's own")
+
+
+class TestContentCacheDisk(unittest.TestCase):
+    def setUp(self):
+        metrics.take()
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def test_disk_hit_shared_by_caches(self):
+        ContentCache(disk_dir=self.dir.name, disk_bytes=100).put("a", b"data")
+        # like another worker process
+        cache = ContentCache(memory_bytes=100, disk_dir=self.dir.name, disk_bytes=100)
+        self.assertEqual(cache.get("a"), b"data", "should hit disk")
+        self.assertEqual(cache.get("a"), b"data", "should hit memory")
+        counters = _counters()
+        self.assertEqual(counters[("bloc_ipt_cache_hits_total", (("tier", "disk"),))], 1)
+        self.assertEqual(counters[("bloc_ipt_cache_hits_total", (("tier", "memory"),))], 1)
+
+    def test_least_recently_used_file_evicted(self):
+        cache = ContentCache(disk_dir=self.dir.name, disk_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        # mtime is what orders files, make a older than b for sure
+        past = time.time() - 10
+        os.utime(cache._disk_path("a"), (past, past))
+        cache.get("a")  # marks a recently used
+        cache.put("c", b"1234")
+        self.assertIsNone(cache.get("b"), "b should be evicted")
+        self.assertEqual(cache.get("a"), b"1234", "a should be kept")
+        self.assertEqual(
+            _counters()[("bloc_ipt_cache_evictions_total", (("tier", "disk"),))], 1)
+
+    def test_no_temp_file_left(self):
+        cache = ContentCache(disk_dir=self.dir.name, disk_bytes=100)
+        cache.put("a", b"data")
+        self.assertEqual(
+            [i for i in os.listdir(self.dir.name) if i.endswith(".tmp")], [])
+
+    def test_disabled_without_disk_bytes(self):
+        cache = ContentCache(disk_dir=self.dir.name)
+        cache.put("a", b"data")
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import time
+import threading
+import unittest
+from unittest import mock
+
+from bloc_client import *
+from bloc_client.bloc_client import BlocClient
+from bloc_client.function_ipt import LazyIptComponent
+from bloc_client.function_run_queue import InProcessFunctionRunMsgQueue
+
+
+def _lazy(loader) -> LazyIptComponent:
+    return LazyIptComponent.New(
+        IptComponent(
+            value_type=ValueType.intValueType,
+            formcontrol_type=FormControlType.FormControlTypeInput,
+            hint="",
+            allow_multi=False),
+        loader)
+
+
+def _msgs(q: InProcessFunctionRunMsgQueue) -> list:
+    msgs = []
+    while True:
+        msg = q.get(block=False)
+        if msg is None:
+            return msgs
+        msgs.append(msg)
+
+
+class _UsesIpts:
+    """reads the value of ipts' components whose index in used"""
+    def __init__(self, used=()):
+        self.used = used
+
+    def run(self, ipts, queue):
+        values = [ipts[0].components[i].value for i in self.used]
+        queue.report_function_run_finished_opt(
+            FunctionRunOpt(suc=True, optKey_map_data={"values": values}))
+
+
+class TestLazyIptComponent(unittest.TestCase):
+    def test_loaded_at_first_access(self):
+        loader = mock.Mock(return_value=1)
+        component = _lazy(loader)
+        self.assertFalse(component.loaded)
+        loader.assert_not_called()
+        self.assertEqual(component.value, 1)
+        self.assertEqual(component.value, 1)
+        self.assertTrue(component.loaded)
+        loader.assert_called_once()
+
+    def test_concurrent_accesses_load_once(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return "v"
+
+        component = _lazy(loader)
+        values = []
+        threads = [
+            threading.Thread(target=lambda: values.append(component.value))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1, "should load once")
+        self.assertEqual(values, ["v"] * 8, "all should get the loaded value")
+
+    def test_set_value_skips_loader(self):
+        loader = mock.Mock()
+        component = _lazy(loader)
+        component.value = 2
+        self.assertEqual(component.value, 2)
+        loader.assert_not_called()
+
+    def test_load_error_raised_to_each_access(self):
+        component = _lazy(mock.Mock(side_effect=Exception("download failed")))
+        for _ in range(2):
+            with self.assertRaisesRegex(Exception, "download failed"):
+                component.value
+        self.assertFalse(component.loaded)
+
+
+class TestRunWithLazyIpts(unittest.TestCase):
+    def _ipts(self, *loaders):
+        return [FunctionIpt(
+            key="k", display="", must=True,
+            components=[_lazy(i) for i in loaders])]
+
+    def test_prefetched_and_used_loaded_once(self):
+        loaders = [mock.Mock(return_value=i) for i in range(3)]
+        q = InProcessFunctionRunMsgQueue.New()
+        BlocClient._run_user_function(
+            _UsesIpts(used=[0, 1, 2]), self._ipts(*loaders), q, prefetch_concurrency=2)
+        [opt] = _msgs(q)
+        self.assertEqual(opt.optKey_map_data["values"], [0, 1, 2])
+        for loader in loaders:
+            loader.assert_called_once()
+
+    def test_pending_prefetches_cancelled_with_run(self):
+        release = threading.Event()
+        started = []
+
+        def slow_loader():
+            started.append(1)
+            release.wait(1)
+
+        q = InProcessFunctionRunMsgQueue.New()
+        # one prefetch thread, busy with the first while the run returns
+        BlocClient._run_user_function(
+            _UsesIpts(), self._ipts(*[slow_loader] * 5), q, prefetch_concurrency=1)
+        release.set()
+        time.sleep(0.05)
+        self.assertEqual(len(started), 1, "prefetches not started should be cancelled")
+        self.assertTrue(_msgs(q)[-1].suc)
+
+    def test_download_error_fails_run(self):
+        q = InProcessFunctionRunMsgQueue.New()
+        loader = mock.Mock(side_effect=Exception("download ipt 0 component 0 failed: 404"))
+        with self.assertLogs(level="ERROR"):
+            BlocClient._run_user_function(_UsesIpts(used=[0]), self._ipts(loader), q)
+        [opt] = _msgs(q)
+        self.assertFalse(opt.suc)
+        self.assertTrue(opt.intercept_below_function_run)
+        self.assertIn("download ipt 0 component 0 failed: 404", opt.error_msg)
+
+    def test_loader_reports_download_error(self):
+        q = InProcessFunctionRunMsgQueue.New()
+        with mock.patch(
+            "bloc_client.bloc_client.get_data_by_object_storage_key",
+            return_value=(None, Exception("404")),
+        ):
+            component = _lazy(lambda: BlocClient._load_ipt_component(
+                "", "key", 0, 0, ValueType.intValueType, False, q))
+            with self.assertRaisesRegex(Exception, "download ipt 0 component 0 failed: 404"):
+                component.value
+        [log] = _msgs(q)
+        self.assertEqual(log.level, LogLevel.error, "error should be in the run's log")
+
+
+if __name__ == '__main__':
+    unittest.main()
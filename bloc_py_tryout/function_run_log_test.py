@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+import threading
+from unittest import mock
+
+from bloc_client.function_run_log import Logger, LogMsgOverheadBytes
+
+
+class _Uploads:
+    """stands for the upload requests, keeps each batch's log lines"""
+    def __init__(self):
+        self.batches = []
+
+    def post(self, url, data, headers=None):
+        self.batches.append([i["data"] for i in data["logs"]])
+        return None, None
+
+    async def async_post(self, url, data, headers=None):
+        return self.post(url, data, headers)
+
+    @property
+    def lines(self):
+        return [line for batch in self.batches for line in batch]
+
+
+def _logger(**kwargs) -> Logger:
+    # long interval, so only full batches and close() upload
+    return Logger(_server_url="", function_run_record_id="r", flush_interval=60, **kwargs)
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        self.uploads = _Uploads()
+        patcher = mock.patch(
+            "bloc_client.function_run_log.sync_post_to_server", self.uploads.post)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_of_batch_size(self):
+        logger = _logger(batch_size=3)
+        for i in range(7):
+            logger.info(str(i))
+        self.assertIsNone(logger.close(), "upload should not fail")
+        self.assertEqual(self.uploads.lines, [str(i) for i in range(7)], "all lines in order")
+        self.assertTrue(all(len(i) <= 3 for i in self.uploads.batches), "batch should not exceed batch_size")
+
+    def test_batches_of_batch_bytes(self):
+        logger = _logger(batch_bytes=2 * (LogMsgOverheadBytes + 10))
+        for i in range(5):
+            logger.info(str(i) * 10)
+        logger.close()
+        self.assertEqual(self.uploads.lines, [str(i) * 10 for i in range(5)], "all lines in order")
+        self.assertTrue(all(len(i) <= 2 for i in self.uploads.batches), "batch should not exceed batch_bytes")
+
+    def test_nothing_uploaded_before_batch_full_or_close(self):
+        logger = _logger(batch_size=100)
+        logger.info("a")
+        self.assertEqual(self.uploads.batches, [], "should be buffered")
+        logger.close()
+        self.assertEqual(self.uploads.batches, [["a"]])
+
+    def test_oldest_dropped_when_buffer_full(self):
+        logger = _logger(buffer_size=3)
+        for i in range(5):
+            logger.info(str(i))
+        logger.close()
+        self.assertEqual(
+            self.uploads.lines,
+            ["2 log lines dropped as log buffer is full", "2", "3", "4"])
+
+    def test_upload_after_close(self):
+        logger = _logger()
+        logger.close()
+        logger.error("late")
+        self.assertEqual(self.uploads.lines, ["late"], "should be uploaded at once")
+
+    def test_async_close_on_loop(self):
+        async def main():
+            logger = _logger(batch_size=2)
+            logger.set_loop(asyncio.get_running_loop())
+            for i in range(3):
+                logger.info(str(i))
+            return await logger.async_close()
+
+        with mock.patch(
+            "bloc_client.function_run_log.post_to_server", self.uploads.async_post,
+        ):
+            self.assertIsNone(asyncio.run(main()), "upload should not fail")
+        self.assertEqual(self.uploads.lines, ["0", "1", "2"], "all lines in order")
+
+    def test_flushed_by_task_on_loop(self):
+        async def main():
+            logger = Logger(_server_url="", function_run_record_id="r", flush_interval=0.01)
+            logger.set_loop(asyncio.get_running_loop())
+            threads = threading.active_count()
+            logger.info("a")
+            await asyncio.sleep(0.1)
+            self.assertEqual(threading.active_count(), threads, "should not start a thread")
+            self.assertEqual(self.uploads.lines, ["a"], "should be uploaded by interval")
+            logger.info("b")
+            return await logger.async_close()
+
+        with mock.patch(
+            "bloc_client.function_run_log.post_to_server", self.uploads.async_post,
+        ):
+            self.assertIsNone(asyncio.run(main()), "upload should not fail")
+        self.assertEqual(self.uploads.lines, ["a", "b"])
+
+    def test_close_from_another_thread(self):
+        async def main():
+            logger = _logger()
+            logger.set_loop(asyncio.get_running_loop())
+            logger.info("a")
+            return await asyncio.get_running_loop().run_in_executor(None, logger.close)
+
+        with mock.patch(
+            "bloc_client.function_run_log.post_to_server", self.uploads.async_post,
+        ):
+            self.assertIsNone(asyncio.run(main()), "upload should not fail")
+        self.assertEqual(self.uploads.lines, ["a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from bloc_client import *
+from bloc_client.bloc_client import BlocClient
+from bloc_client.function_run_queue import AsyncFunctionRunMsgQueue
+from bloc_client.function_run_report_outbox import FunctionRunReportOutbox
+from bloc_client.function_run_progress_report import (
+    HighReadableFunctionRunProgress, HighReadableFunctionRunProgressReporter)
+
+
+class _Posts:
+    """stands for the requests to server, keeps each one's api and data"""
+    def __init__(self):
+        self.posts = []
+
+    async def post(self, url, data, headers=None):
+        self.posts.append((url.rsplit("/", 1)[-1], data))
+        return None, None
+
+    @property
+    def progresses(self):
+        return [
+            data["high_readable_run_progress"]
+            for api, data in self.posts if api == "report_progress"]
+
+
+def _progress(**kwargs) -> HighReadableFunctionRunProgress:
+    return HighReadableFunctionRunProgress(**kwargs)
+
+
+class TestProgressReporter(unittest.TestCase):
+    def setUp(self):
+        self.posts = _Posts()
+        for module in ["function_run_progress_report", "function_run_record"]:
+            patcher = mock.patch(f"bloc_client.{module}.post_to_server", self.posts.post)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _reporter(self, **kwargs) -> HighReadableFunctionRunProgressReporter:
+        return HighReadableFunctionRunProgressReporter("t", "s", "", "r", **kwargs)
+
+    def test_latest_wins_within_interval(self):
+        async def main():
+            reporter = self._reporter(min_interval=60)
+            await reporter.async_add(_progress(progress_percent=10))  # first is due
+            await reporter.async_add(_progress(progress_percent=20, msg="a"))
+            await reporter.async_add(_progress(progress_percent=30))
+            self.assertEqual(len(self.posts.progresses), 1, "should wait for min_interval")
+            await reporter.async_flush()
+
+        asyncio.run(main())
+        self.assertEqual(self.posts.progresses, [
+            {"progress": 10},
+            {"progress": 30, "msg": "a"}])
+
+    def test_milestone_change_sent_at_once(self):
+        async def main():
+            reporter = self._reporter(min_interval=60)
+            await reporter.async_add(_progress(progress_milestone_index=0))
+            await reporter.async_add(_progress(progress_percent=50, progress_milestone_index=0))
+            self.assertEqual(len(self.posts.progresses), 1, "same milestone should wait")
+            await reporter.async_add(_progress(progress_milestone_index=1))
+
+        asyncio.run(main())
+        self.assertEqual(self.posts.progresses, [
+            {"progress_milestone_index": 0},
+            {"progress": 50, "progress_milestone_index": 1}])
+
+    def test_wait_seconds(self):
+        async def main():
+            reporter = self._reporter(min_interval=0.05)
+            self.assertIsNone(reporter.wait_seconds(), "nothing pending")
+            await reporter.async_add(_progress(progress_percent=10))
+            self.assertIsNone(reporter.wait_seconds(), "sent already")
+            await reporter.async_add(_progress(progress_percent=20))
+            self.assertGreater(reporter.wait_seconds(), 0)
+            self.assertLessEqual(reporter.wait_seconds(), 0.05)
+            await asyncio.sleep(0.06)
+            self.assertEqual(reporter.wait_seconds(), 0, "should be due")
+            await reporter.async_report_if_due()
+
+        asyncio.run(main())
+        self.assertEqual(self.posts.progresses, [{"progress": 10}, {"progress": 20}])
+
+    def test_put_into_outbox(self):
+        async def main():
+            outbox = FunctionRunReportOutbox(mock.Mock())
+            reporter = self._reporter(outbox=outbox)
+            await reporter.async_add(_progress(progress_percent=10))
+            await outbox.close()
+
+        asyncio.run(main())
+        self.assertEqual(self.posts.progresses, [{"progress": 10}])
+
+    def test_flushed_before_finished_report(self):
+        async def main():
+            q = AsyncFunctionRunMsgQueue.New()
+            q.report_high_readable_progress(progress_percent=10)
+            q.report_high_readable_progress(progress_percent=90)
+            q.report_function_run_finished_opt(FunctionRunOpt(suc=True))
+            return await BlocClient._async_read(
+                "t", "s", "", "r", mock.Mock(), q, progress_report_min_interval=60)
+
+        self.assertTrue(asyncio.run(main()), "should finish before deadline")
+        self.assertEqual([api for api, _ in self.posts.posts], [
+            "report_progress", "report_progress", "function_run_finished"])
+        self.assertEqual(self.posts.progresses[-1], {"progress": 90}, "latest should be sent")
+
+
+if __name__ == '__main__':
+    unittest.main()
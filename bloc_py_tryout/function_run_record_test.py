@@ -0,0 +1,36 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from bloc_client.function_run_record import _parse_server_time, _parse_function_run_record
+
+
+class TestParseServerTime(unittest.TestCase):
+    def test_golang_times(self):
+        self.assertEqual(
+            _parse_server_time("2024-01-02T03:04:05.123456789+07:00"),
+            datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=timezone(timedelta(hours=7))))
+        self.assertEqual(
+            _parse_server_time("2024-01-02T03:04:05Z"),
+            datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+
+    def test_no_deadline(self):
+        for value in [None, "", "0001-01-01T00:00:00Z"]:
+            self.assertIsNone(_parse_server_time(value), f"{value!r} is no deadline")
+
+    def test_not_understood_is_no_deadline(self):
+        for value in ["tomorrow", "2024-13-01T00:00:00Z"]:
+            with self.assertLogs(level="WARNING"):
+                self.assertIsNone(_parse_server_time(value), f"{value!r} is no deadline")
+
+    def test_record_with_bad_deadline_still_parsed(self):
+        with self.assertLogs(level="WARNING"):
+            record, err = _parse_function_run_record({
+                "id": "r", "flow_id": "f", "function_id": "fn",
+                "flow_function_id": "ff", "trace_id": "t", "ipt": [],
+                "should_be_canceled_at": "tomorrow"})
+        self.assertIsNone(err, "should parse")
+        self.assertIsNone(record.deadline, "should have no deadline")
+
+
+if __name__ == '__main__':
+    unittest.main()
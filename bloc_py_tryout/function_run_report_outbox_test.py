@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+
+from bloc_client.function_run_report_outbox import FunctionRunReportOutbox, send_report
+
+
+class _Logger:
+    def __init__(self):
+        self.errors = []
+        self.infos = []
+
+    def error(self, msg: str):
+        self.errors.append(msg)
+
+    def info(self, msg: str):
+        self.infos.append(msg)
+
+
+async def _report(sent: list, name: str, seconds: float=0, err: Exception=None):
+    await asyncio.sleep(seconds)
+    sent.append(name)
+    return err
+
+
+async def _raise_report():
+    raise RuntimeError("broken report")
+
+
+class TestFunctionRunReportOutbox(unittest.TestCase):
+    def test_sent_in_put_order(self):
+        async def main():
+            sent, outbox = [], FunctionRunReportOutbox(_Logger())
+            # start is the slowest, still sent before the others
+            outbox.put("start", _report(sent, "start", 0.05))
+            outbox.put("progress", _report(sent, "progress"))
+            outbox.put("finished", _report(sent, "finished"), log_sent=True)
+            self.assertEqual(sent, [], "put should not wait for sending")
+            await outbox.close()
+            return sent, outbox.logger
+        sent, logger = asyncio.run(main())
+        self.assertEqual(sent, ["start", "progress", "finished"])
+        self.assertEqual(logger.infos, ["report finished"], "only log_sent report is logged")
+
+    def test_close_waits_all_sent(self):
+        async def main():
+            sent, outbox = [], FunctionRunReportOutbox(_Logger())
+            for i in range(5):
+                outbox.put(str(i), _report(sent, str(i), 0.01))
+            await outbox.close()
+            sent.append("ack")
+            return sent
+        self.assertEqual(asyncio.run(main()), ["0", "1", "2", "3", "4", "ack"])
+
+    def test_failed_reports_dont_stop_sending(self):
+        async def main():
+            sent, outbox = [], FunctionRunReportOutbox(_Logger())
+            outbox.put("start", _report(sent, "start", err=Exception("status 500")))
+            outbox.put("progress", _raise_report())
+            outbox.put("finished", _report(sent, "finished"))
+            await outbox.close()
+            return sent, outbox.logger
+        sent, logger = asyncio.run(main())
+        self.assertEqual(sent, ["start", "finished"], "later reports should still be sent")
+        self.assertEqual(len(logger.errors), 2, "both failures should be logged")
+
+    def test_close_without_reports(self):
+        asyncio.run(FunctionRunReportOutbox(_Logger()).close())
+
+    def test_send_report_without_outbox_waits(self):
+        async def main():
+            sent, logger = [], _Logger()
+            await send_report(logger, "start", _report(sent, "start", 0.01))
+            self.assertEqual(sent, ["start"], "should be sent when send_report returns")
+            await send_report(logger, "finished", _report(sent, "finished", err=Exception("down")))
+            return logger
+        logger = asyncio.run(main())
+        self.assertEqual(logger.errors, ["report finished failed: down"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import os
 import unittest
 
 from bloc_client import *
@@ -27,6 +28,57 @@ class TestMathCalcuNode(unittest.TestCase):
         self.assertFalse(opt.intercept_below_function_run, "should not intercept below function run")
         self.assertEqual(opt.optKey_map_data['result'], 3, "result should be 3")
 
+    def test_add_in_thread_and_inline(self):
+        for execution_policy in [ExecutionPolicy.thread, ExecutionPolicy.inline]:
+            opt = self.client.test_run_function(
+                MathCalcu(),
+                [
+                    [[1, 2, 3]],  # ipt 0, component 0, numbers
+                    [1],  # ipt 1, "+" operater
+                ],
+                execution_policy=execution_policy,
+            )
+            self.assertIsInstance(opt, FunctionRunOpt, "opt is not FunctionRunOpt type")
+            self.assertTrue(opt.suc, "should suc")
+            self.assertEqual(opt.optKey_map_data['result'], 6, "result should be 6")
+
+    def test_add_opt_through_shared_memory(self):
+        def shared_memory_blocks():
+            return {i for i in os.listdir("/dev/shm") if i.startswith("psm_")}
+
+        if not os.path.isdir("/dev/shm"):
+            self.skipTest("no /dev/shm to check")
+        self.client.get_config_builder().set_opt_shared_memory(min_bytes=1)
+        before = shared_memory_blocks()
+        opt = self.client.test_run_function(MathCalcu(), [[[1, 2, 3]], [1]])
+        self.assertEqual(opt.optKey_map_data['result'], 6, "result should be 6")
+        self.assertEqual(shared_memory_blocks() - before, set(), "block should be freed")
+
+    def test_add_batch(self):
+        results = self.client.test_run_function_batch(
+            MathCalcu(),
+            [
+                [[list(range(i))], [1]]  # sum of 0..i-1
+                for i in range(1, 6)
+            ],
+            concurrency=2,
+        )
+        self.assertEqual(len(results), 5, "should have a result for each params")
+        for i, result in enumerate(results, start=1):
+            self.assertIsInstance(result, FunctionTestRunResult, "result is not FunctionTestRunResult type")
+            self.assertEqual(result.error, "", "should have no error")
+            self.assertTrue(result.opt.suc, "should suc")
+            self.assertEqual(result.opt.optKey_map_data['result'], sum(range(i)), "result in params order")
+            self.assertGreater(result.wall_seconds, 0, "wall time should be measured")
+            self.assertEqual(result.peak_memory_bytes, 0, "memory not measured by default")
+
+    def test_add_batch_measure_memory(self):
+        [result] = self.client.test_run_function_batch(
+            MathCalcu(), [[[list(range(10000))], [1]]],
+            concurrency=1, measure_memory=True)
+        self.assertEqual(result.error, "", "should have no error")
+        self.assertGreater(result.peak_memory_bytes, 0, "memory should be measured")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+
+from bloc_client.internal.metrics import Metrics
+
+
+class TestMetricsExposition(unittest.TestCase):
+    def test_counter(self):
+        m = Metrics()
+        m.inc("bloc_function_runs_total", result="suc")
+        m.inc("bloc_function_runs_total", 2, result="suc")
+        m.inc("bloc_function_runs_total", result="failed")
+        self.assertEqual(m.exposition(), (
+            "# HELP bloc_function_runs_total finished function runs by result\n"
+            "# TYPE bloc_function_runs_total counter\n"
+            'bloc_function_runs_total{result="failed"} 1\n'
+            'bloc_function_runs_total{result="suc"} 3\n'))
+
+    def test_gauge(self):
+        m = Metrics()
+        m.set_gauge("bloc_consumer_running_runs", 3)
+        m.set_gauge("bloc_consumer_running_runs", 2)
+        self.assertIn("# TYPE bloc_consumer_running_runs gauge\n", m.exposition())
+        self.assertIn("bloc_consumer_running_runs 2\n", m.exposition(), "gauge should be the last set")
+
+    def test_histogram_buckets_cumulative(self):
+        m = Metrics(buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            m.observe("bloc_http_request_seconds", value, api="x")
+        self.assertEqual(m.exposition(), (
+            "# HELP bloc_http_request_seconds seconds of requests to bloc-server by api\n"
+            "# TYPE bloc_http_request_seconds histogram\n"
+            'bloc_http_request_seconds_bucket{api="x",le="0.1"} 2\n'
+            'bloc_http_request_seconds_bucket{api="x",le="1"} 3\n'
+            'bloc_http_request_seconds_bucket{api="x",le="+Inf"} 4\n'
+            'bloc_http_request_seconds_sum{api="x"} 2.65\n'
+            'bloc_http_request_seconds_count{api="x"} 4\n'))
+
+    def test_time_observes_when_raises(self):
+        m = Metrics(buckets=(1,))
+        with self.assertRaises(KeyError):
+            with m.time("bloc_http_request_seconds", api="x"):
+                raise KeyError()
+        self.assertIn('bloc_http_request_seconds_count{api="x"} 1\n', m.exposition())
+
+    def test_label_value_escaped(self):
+        m = Metrics()
+        m.inc("some_total", api='a\\b"c\nd')
+        self.assertIn('some_total{api="a\\\\b\\"c\\nd"} 1\n', m.exposition())
+
+    def test_unknown_metric_untyped(self):
+        m = Metrics()
+        m.inc("some_total")
+        self.assertEqual(m.exposition(), (
+            "# HELP some_total some_total\n"
+            "# TYPE some_total untyped\n"
+            "some_total 1\n"))
+
+    def test_write_textfile(self):
+        m = Metrics()
+        m.inc("some_total")
+        with tempfile.TemporaryDirectory() as dir:
+            file_path = os.path.join(dir, "bloc.prom")
+            m.write_textfile(file_path)
+            with open(file_path) as f:
+                self.assertEqual(f.read(), m.exposition())
+            self.assertEqual(os.listdir(dir), ["bloc.prom"], "no temp file should be left")
+
+
+class TestMetricsTakeMerge(unittest.TestCase):
+    def test_take_clears(self):
+        m = Metrics()
+        self.assertIsNone(m.take(), "nothing recorded")
+        m.inc("some_total")
+        self.assertEqual(m.take()["counters"], {("some_total", ()): 1})
+        self.assertIsNone(m.take(), "should be cleared by last take")
+
+    def test_gauges_not_taken(self):
+        m = Metrics()
+        m.set_gauge("bloc_consumer_running_runs", 1)
+        self.assertIsNone(m.take(), "gauge is process local")
+        self.assertIn("bloc_consumer_running_runs 1\n", m.exposition())
+
+    def test_merge_from_workers(self):
+        parent = Metrics(buckets=(1,))
+        parent.inc("some_total", kind="a")
+        parent.observe("some_seconds", 0.5)
+        for _ in range(2):  # two workers
+            worker = Metrics(buckets=(1,))
+            worker.inc("some_total", kind="a")
+            worker.inc("some_total", kind="b")
+            worker.observe("some_seconds", 2)
+            parent.merge(worker.take())
+        parent.merge(None)
+
+        taken = parent.take()
+        self.assertEqual(taken["counters"], {
+            ("some_total", (("kind", "a"),)): 3,
+            ("some_total", (("kind", "b"),)): 2})
+        # buckets(not cumulative) + [sum, count]
+        self.assertEqual(taken["histograms"], {("some_seconds", ()): [1, 2, 4.5, 3]})
+
+    def test_merged_histogram_not_shared(self):
+        worker, parent = Metrics(buckets=(1,)), Metrics(buckets=(1,))
+        worker.observe("some_seconds", 0.5)
+        taken = worker.take()
+        parent.merge(taken)
+        parent.observe("some_seconds", 0.5)
+        self.assertEqual(taken["histograms"][("some_seconds", ())], [1, 0, 0.5, 1], "taken should not change")
+
+
+if __name__ == '__main__':
+    unittest.main()
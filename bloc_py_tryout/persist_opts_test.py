@@ -0,0 +1,36 @@
+import unittest
+from unittest import mock
+
+from bloc_client import *
+from bloc_client.bloc_client import BlocClient
+
+
+class TestFillPersistedOpts(unittest.TestCase):
+    def test_persisted(self):
+        opt = FunctionRunOpt(suc=True, optKey_map_data={"n": 1, "s": "x" * 60})
+        opt.optKey_map_objectStorageKey, opt.optKey_map_briefData = {}, {}
+        BlocClient._fill_persisted_opts(opt, [
+            ("n", 1, {"object_storage_key": "k1"}, None),
+            ("s", "x" * 60, {"object_storage_key": "k2"}, None),
+        ], mock.Mock())
+        self.assertTrue(opt.suc)
+        self.assertEqual(opt.optKey_map_objectStorageKey, {"n": "k1", "s": "k2"})
+        self.assertEqual(opt.optKey_map_briefData, {"n": "1", "s": "x" * 50})
+
+    def test_persist_failed_fails_run(self):
+        opt = FunctionRunOpt(suc=True, optKey_map_data={"a": 1, "b": 2, "c": 3})
+        opt.optKey_map_objectStorageKey, opt.optKey_map_briefData = {}, {}
+        logger = mock.Mock()
+        BlocClient._fill_persisted_opts(opt, [
+            ("a", 1, None, Exception("timeout")),
+            ("b", 2, {"object_storage_key": "k"}, None),
+            ("c", 3, None, Exception("timeout")),
+        ], logger)
+        self.assertFalse(opt.suc, "below functions would read a missing opt")
+        self.assertTrue(opt.intercept_below_function_run)
+        self.assertIn("a, c", opt.error_msg)
+        self.assertEqual(logger.error.call_count, 2, "each failure should be logged")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import json
+import base64
+import random
+import unittest
+
+from bloc_client.internal.resp_stream import Base64DataExtractor
+
+
+def _extract(resp: bytes, split_points=()):
+    """feed resp to extractor in chunks split at split_points, return (data, resp without data)"""
+    file = io.BytesIO()
+    extractor = Base64DataExtractor(file)
+    start = 0
+    for point in sorted(split_points) + [len(resp)]:
+        extractor.feed(resp[start:point])
+        start = point
+    return file.getvalue(), extractor.data_bytes, extractor.finish()
+
+
+def _resp(data) -> bytes:
+    return json.dumps({
+        "status_code": 200,
+        "status_msg": "ok",
+        "data": base64.b64encode(data).decode() if data is not None else None,
+        "size": 1,
+    }).encode()
+
+
+class TestBase64DataExtractor(unittest.TestCase):
+    def test_in_one_chunk(self):
+        data, data_bytes, resp = _extract(_resp(b"hello"))
+        self.assertEqual(data, b"hello")
+        self.assertEqual(data_bytes, 5)
+        self.assertEqual(resp["status_code"], 200, "rest of resp should be kept")
+        self.assertEqual(resp["size"], 1, "fields after data should be kept")
+
+    def test_split_at_any_point(self):
+        payload = bytes(range(256)) * 4
+        resp = _resp(payload)
+        for point in range(len(resp) + 1):
+            data, data_bytes, _ = _extract(resp, [point])
+            self.assertEqual(data, payload, f"split at {point} should decode")
+            self.assertEqual(data_bytes, len(payload))
+
+    def test_many_small_chunks(self):
+        rand = random.Random(0)
+        payload = rand.getrandbits(8 * 10000).to_bytes(10000, "little")
+        resp = _resp(payload)
+        points = rand.sample(range(len(resp)), 500)
+        data, _, _ = _extract(resp, points)
+        self.assertEqual(data, payload)
+
+    def test_null_data(self):
+        data, data_bytes, resp = _extract(_resp(None), [10])
+        self.assertEqual(data, b"", "nothing should be written")
+        self.assertEqual(data_bytes, 0)
+        self.assertIsNone(resp["data"])
+        self.assertEqual(resp["status_msg"], "ok")
+
+    def test_not_string_data(self):
+        with self.assertRaises(ValueError):
+            _extract(b'{"status_code": 200, "data": 1}')
+
+    def test_resp_ended_inside_data(self):
+        resp = _resp(b"hello")
+        with self.assertRaises(ValueError):
+            _extract(resp[:resp.index(b'"data"') + 12])
+
+    def test_invalid_base64(self):
+        for data in [b"QUJDR", b"Q!=="]:
+            resp = b'{"status_code": 200, "data": "' + data + b'"}'
+            with self.assertRaises(ValueError, msg=f"{data!r} should not decode"):
+                _extract(resp)
+
+    def test_escaped_data_key_not_matched(self):
+        resp = json.dumps({
+            "status_msg": 'say "data": "x"',
+            "data": base64.b64encode(b"real").decode(),
+        }).encode()
+        data, _, resp = _extract(resp)
+        self.assertEqual(data, b"real")
+        self.assertEqual(resp["status_msg"], 'say "data": "x"')
+
+
+if __name__ == '__main__':
+    unittest.main()
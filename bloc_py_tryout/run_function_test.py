@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import unittest
+from unittest import mock
+from functools import partial
+from multiprocessing import Event, Process
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from bloc_client import *
+from bloc_client.internal import worker_pool
+from bloc_client.internal.worker_pool import WorkerPool
+from benchmarks.fake_bloc_server import serve
+
+from bloc_py_tryout.math_calcu import MathCalcu
+
+
+class _OnlyLogs(MathCalcu):
+    """returns without reporting opt"""
+    def run(self, ipts, queue):
+        queue.report_log(LogLevel.info, "forgot to report opt")
+
+
+class _Exits(MathCalcu):
+    """kills the worker process in the middle of the run, like a segfault"""
+    def run(self, ipts, queue):
+        os._exit(1)
+
+
+class _Sleeps(MathCalcu):
+    """stuck far beyond any deadline given in tests"""
+    def run(self, ipts, queue):
+        time.sleep(30)
+
+
+class _Rabbit:
+    def ack(self, delivery_tag: int):
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestRunFunctionInWorker(unittest.TestCase):
+    """whole lifecycle of runs in pool workers, against a local stand-in of bloc-server"""
+
+    @classmethod
+    def setUpClass(cls):
+        port = _free_port()
+        ready = Event()
+        cls.server_process = Process(target=serve, args=(port, ready), daemon=True)
+        cls.server_process.start()
+        ready.wait()
+        cls.port = port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server_process.terminate()
+        cls.server_process.join()
+
+    def setUp(self):
+        self.client = BlocClient.new_client("test")
+        self.client.get_config_builder().set_server("127.0.0.1", self.port)
+        group = self.client.register_function_group("math")
+        for policy in ExecutionPolicy:
+            group.add_function(policy.value, "", MathCalcu(), execution_policy=policy)
+            group.add_function(f"only_logs_{policy.value}", "", _OnlyLogs(), execution_policy=policy)
+            group.add_function(f"exits_{policy.value}", "", _Exits(), execution_policy=policy)
+            group.add_function(f"sleeps_{policy.value}", "", _Sleeps(), execution_policy=policy)
+        asyncio.run(self.client.register_functions_to_server())
+
+    def _stats(self) -> dict:
+        return httpx.get(f"http://127.0.0.1:{self.port}/bench/stats").json()["data"]
+
+    def _submit(self, function_run_record_id: str) -> bool:
+        """run function_run_record_id's msg in a pool worker, like it's delivered.
+        return whether the worker is replaced after it"""
+        async def run():
+            with WorkerPool(
+                handler=partial(
+                    BlocClient._run_function_in_worker,
+                    client_name=self.client.name,
+                    server_url=self.client.gen_req_server_path(),
+                    id_map_function=self.client.id_map_function),
+                size=1,
+            ) as pool:
+                workers = set(pool._workers)
+                slots = asyncio.Semaphore(1)
+                await slots.acquire()
+                await BlocClient._run_and_ack(pool, _Rabbit(), slots, 1, json.dumps({
+                    "FunctionRunRecordID": function_run_record_id,
+                    "ClientName": self.client.name}).encode())
+                return pool._workers != workers
+
+        return asyncio.run(run())
+
+    def _new_run(self, function_name: str, ipt: list, timeout: float=0) -> str:
+        """timeout: seconds from now to it's should_be_canceled_at, 0 is no deadline"""
+        run = {"function_id": f"math.{function_name}", "ipt": ipt}
+        if timeout:
+            run["should_be_canceled_at"] = (
+                datetime.now(timezone.utc) + timedelta(seconds=timeout)).isoformat()
+        return httpx.post(
+            f"http://127.0.0.1:{self.port}/bench/new_run", json=run).json()["data"]
+
+    def _run(self, function_name: str, ipt: list) -> dict:
+        """run function in a pool worker, return it's record kept by server"""
+        function_run_record_id = self._new_run(function_name, ipt)
+        self._submit(function_run_record_id)
+        return self._stats()["records"][function_run_record_id]
+
+    def test_each_execution_policy(self):
+        for policy in ExecutionPolicy:
+            record = self._run(policy.value, [["[1, 2, 3]"], ["1"]])
+            self.assertIn("started", record["phases"], f"{policy} should report start")
+            self.assertIn("finished", record["phases"], f"{policy} should report finished")
+            self.assertTrue(record["suc"], f"{policy} should suc")
+
+    def test_returned_without_opt(self):
+        for policy in ExecutionPolicy:
+            record = self._run(f"only_logs_{policy.value}", [["[1, 2, 3]"], ["1"]])
+            self.assertIn("finished", record["phases"], f"{policy} should report finished")
+            self.assertFalse(record["suc"], f"{policy} should fail")
+
+    def test_worker_exited(self):
+        for policy in ExecutionPolicy:
+            with self.assertLogs(level="ERROR"):
+                record = self._run(f"exits_{policy.value}", [["[1, 2, 3]"], ["1"]])
+            self.assertIn("finished", record["phases"], f"{policy} should be reported finished by pool")
+            self.assertFalse(record["suc"], f"{policy} should fail")
+
+    def test_timeout_canceled_in_worker(self):
+        function_run_record_id = self._new_run(
+            f"sleeps_{ExecutionPolicy.thread.value}", [["[1]"], ["1"]], timeout=1)
+        start = time.time()
+        worker_replaced = self._submit(function_run_record_id)
+        self.assertLess(time.time() - start, 10, "should not wait for the run")
+        record = self._stats()["records"][function_run_record_id]
+        self.assertTrue(record["timeout_canceled"], "should be reported timeout canceled")
+        self.assertFalse(record["suc"])
+        self.assertTrue(worker_replaced, "worker with the stuck thread should be retired")
+
+    def test_worker_killed_beyond_deadline(self):
+        # inline run blocks the worker's loop, so only the pool can stop it
+        function_run_record_id = self._new_run(
+            f"sleeps_{ExecutionPolicy.inline.value}", [["[1]"], ["1"]], timeout=0.5)
+        start = time.time()
+        with mock.patch.object(worker_pool, "DeadlineGraceSeconds", 0.5), \
+                self.assertLogs(level="ERROR"):
+            worker_replaced = self._submit(function_run_record_id)
+        self.assertLess(time.time() - start, 10, "worker should be killed")
+        record = self._stats()["records"][function_run_record_id]
+        self.assertIn("finished", record["phases"], "should be reported finished by pool")
+        self.assertTrue(record["timeout_canceled"], "should be reported timeout canceled")
+        self.assertTrue(worker_replaced, "killed worker should be replaced")
+
+    def test_ipt_not_decodable(self):
+        record = self._run(ExecutionPolicy.thread.value, [["[1, 2, x]"], ["1"]])
+        self.assertIn("finished", record["phases"], "should report finished")
+        self.assertFalse(record["suc"], "should fail without running")
+
+    def test_record_not_found(self):
+        finished_reports = self._stats()["request_counts"].get("function_run_finished", 0)
+        self._submit("no_such_record")
+        self.assertEqual(
+            self._stats()["request_counts"].get("function_run_finished", 0),
+            finished_reports + 1,
+            "run should be reported finished(failed) without running")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import json
+import asyncio
+import tempfile
+import unittest
+from typing import List, Optional
+
+from bloc_client.internal.metrics import metrics
+from bloc_client.internal.tracing import Span, Tracer, tracer, export_spans, keep_export_spans
+from bloc_client.span_sink import SpanSink, JsonLinesSpanSink, _otlp_id, _otlp_span
+
+
+def _span(name: str="s", **kwargs) -> Span:
+    return Span(**dict(dict(
+        name=name, trace_id="t", span_id=name, parent_span_id="", start_time=1, end_time=2,
+    ), **kwargs))
+
+
+def _enabled_tracer(**kwargs) -> Tracer:
+    t = Tracer(**kwargs)
+    t.enabled = True
+    return t
+
+
+class _Sink(SpanSink):
+    """keeps each exported batch, fails the batches whose index in fail_batches"""
+    def __init__(self, fail_batches=()):
+        self.batches: List[List[Span]] = []
+        self.fail_batches = fail_batches
+
+    def export(self, spans: List[Span]) -> Optional[Exception]:
+        self.batches.append(spans)
+        if len(self.batches) - 1 in self.fail_batches:
+            return Exception("collector down")
+        return None
+
+
+class TestTracer(unittest.TestCase):
+    def test_nothing_recorded_unless_enabled(self):
+        t = Tracer()
+        t.record("a", "t", "", start_time=1)
+        with t.span("b", "t", "") as span:
+            self.assertIsNone(span)
+        self.assertEqual(t.take(), [])
+
+    def test_record(self):
+        t = _enabled_tracer()
+        t.record("a", "t", "p", start_time=1, end_time=3, attributes={"k": 1})
+        [span] = t.take()
+        self.assertEqual(
+            (span.name, span.trace_id, span.parent_span_id, span.duration, span.attributes),
+            ("a", "t", "p", 2, {"k": 1}))
+        self.assertTrue(span.span_id, "span_id should be generated")
+        self.assertEqual(t.take(), [], "should be cleared by last take")
+
+    def test_span_and_add_to_span(self):
+        t = _enabled_tracer()
+
+        async def request():
+            t.add_to_span(bytes=10)
+
+        async def main():
+            with t.span("run", "t", "p", attributes={"k": "v"}) as span:
+                t.add_to_span(bytes=5)
+                await asyncio.create_task(request())
+            t.add_to_span(bytes=100)  # no span, ignored
+            return span
+
+        span = asyncio.run(main())
+        self.assertEqual(t.take(), [span])
+        self.assertEqual(span.attributes, {"k": "v", "bytes": 15}, "task should add to span it's started in")
+        self.assertGreaterEqual(span.end_time, span.start_time)
+        self.assertEqual(span.error, "")
+
+    def test_span_error(self):
+        t = _enabled_tracer()
+        with self.assertRaises(KeyError):
+            with t.span("run", "t", ""):
+                raise KeyError("x")
+        [span] = t.take()
+        self.assertEqual(span.error, "KeyError('x')")
+
+    def test_oldest_dropped_beyond_max_spans(self):
+        metrics.take()
+        t = Tracer(max_spans=2)
+        t.extend([_span("a"), _span("b"), _span("c")])
+        self.assertEqual([i.name for i in t.take()], ["b", "c"])
+        self.assertEqual(metrics.take()["counters"], {("bloc_spans_dropped_total", ()): 1})
+
+
+class TestExportSpans(unittest.TestCase):
+    def setUp(self):
+        metrics.take()
+
+    def test_in_batches(self):
+        sink = _Sink(fail_batches=[1])
+        spans = [_span(str(i)) for i in range(5)]
+        with self.assertLogs(level="WARNING"):
+            export_spans(sink, spans, batch_size=2)
+        self.assertEqual([len(i) for i in sink.batches], [2, 2, 1])
+        self.assertEqual([i for batch in sink.batches for i in batch], spans, "all spans in order")
+        self.assertEqual(metrics.take()["counters"], {
+            ("bloc_spans_exported_total", (("result", "ok"),)): 3,
+            ("bloc_spans_exported_total", (("result", "error"),)): 2})
+
+    def test_rest_exported_when_cancelled(self):
+        sink = _Sink()
+
+        async def main():
+            task = asyncio.create_task(keep_export_spans(sink, interval=60, batch_size=10))
+            await asyncio.sleep(0)
+            tracer.extend([_span("a")])
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        self.assertEqual([[i.name for i in batch] for batch in sink.batches], [["a"]])
+
+
+class TestSpanSinks(unittest.TestCase):
+    def test_json_lines(self):
+        with tempfile.TemporaryDirectory() as dir:
+            sink = JsonLinesSpanSink(os.path.join(dir, "spans.jsonl"))
+            self.assertIsNone(sink.export([_span("a")]))
+            self.assertIsNone(sink.export([_span("b", error="e")]))
+            with open(sink.file_path) as f:
+                lines = [json.loads(i) for i in f]
+        self.assertEqual([i["name"] for i in lines], ["a", "b"], "should be appended")
+        self.assertEqual(lines[0]["duration"], 1)
+        self.assertEqual(lines[1]["error"], "e")
+
+    def test_json_lines_failed(self):
+        with tempfile.TemporaryDirectory() as dir:
+            sink = JsonLinesSpanSink(os.path.join(dir, "no_such_dir", "spans.jsonl"))
+            self.assertIsInstance(sink.export([_span()]), OSError)
+
+    def test_otlp_ids(self):
+        uuid = "0a1b2c3d-4e5f-6789-abcd-ef0123456789"
+        self.assertEqual(_otlp_id(uuid, 32), "0a1b2c3d4e5f6789abcdef0123456789", "uuid fits a trace id")
+        span_id = _otlp_id(uuid, 16)
+        self.assertEqual(len(span_id), 16, "uuid hashed into a span id")
+        self.assertEqual(span_id, _otlp_id(uuid, 16), "same id should hash the same")
+        self.assertTrue(all(c in "0123456789abcdef" for c in span_id))
+
+    def test_otlp_span(self):
+        otlp_span = _otlp_span(_span("a", parent_span_id="p", error="e", attributes={"n": 1}))
+        self.assertEqual(otlp_span["startTimeUnixNano"], "1000000000")
+        self.assertEqual(otlp_span["status"], {"code": 2, "message": "e"})
+        self.assertEqual(otlp_span["parentSpanId"], _otlp_id("p", 16))
+        self.assertIn({"key": "n", "value": {"intValue": "1"}}, otlp_span["attributes"])
+        self.assertIn({"key": "bloc.span_id", "value": {"stringValue": "a"}}, otlp_span["attributes"])
+        self.assertNotIn("parentSpanId", _otlp_span(_span("root")), "root span has no parent")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from array import array
+from unittest import mock
+
+from bloc_client.value_type import ValueType
+from bloc_client.internal import value_decoder
+from bloc_client.internal.value_decoder import ArrayFormat, decode_value
+
+
+def _decode_array(data: bytes, value_type: ValueType):
+    return decode_value(data, value_type, True, ArrayFormat.array)
+
+
+class TestDecodeNumberArray(unittest.TestCase):
+    def test_int_array(self):
+        ret = _decode_array(b"[1, -2, 3]", ValueType.intValueType)
+        self.assertEqual(ret, array("q", [1, -2, 3]))
+
+    def test_float_array(self):
+        ret = _decode_array(b"[1.5, -2, 3e2]", ValueType.floatValueType)
+        self.assertEqual(ret, array("d", [1.5, -2.0, 300.0]))
+
+    def test_integral_float_items_are_int(self):
+        ret = _decode_array(b"[1.0, 2e1, -3.00]", ValueType.intValueType)
+        self.assertEqual(ret, array("q", [1, 20, -3]))
+
+    def test_not_integral_items_are_not_int(self):
+        for data in [b"[1.5]", b"[1, x]", b"[nan]", b"[1,]"]:
+            with self.assertRaises(ValueError, msg=f"{data!r} should not decode"):
+                _decode_array(data, ValueType.intValueType)
+
+    def test_empty_and_whitespace(self):
+        self.assertEqual(_decode_array(b"[]", ValueType.intValueType), array("q"))
+        self.assertEqual(_decode_array(b" [ ] \n", ValueType.intValueType), array("q"))
+        self.assertEqual(
+            _decode_array(b"\n[ 1 ,\n2 ]\n", ValueType.intValueType), array("q", [1, 2]))
+
+    def test_not_in_brackets(self):
+        for data in [b"1, 2", b"[1, 2", b"{}"]:
+            with self.assertRaises(ValueError, msg=f"{data!r} should not decode"):
+                _decode_array(data, ValueType.intValueType)
+
+    def test_parsed_across_chunks(self):
+        items = list(range(1000))
+        data = ("[" + ", ".join(map(str, items)) + "]").encode()
+        with mock.patch.object(value_decoder, "_ArrayParseChunkBytes", 16):
+            self.assertEqual(
+                _decode_array(data, ValueType.intValueType), array("q", items))
+
+    def test_list_format(self):
+        self.assertEqual(
+            decode_value(b"[1, 2]", ValueType.intValueType, True), [1, 2])
+        self.assertEqual(
+            decode_value(b'["a", "b"]', ValueType.strValueType, True, ArrayFormat.array),
+            ["a", "b"],
+            "array format only applies to int/float")
+        with self.assertRaises(ValueError):
+            decode_value(b'{"a": 1}', ValueType.intValueType, True)
+
+
+class TestDecodeScalar(unittest.TestCase):
+    def test_int(self):
+        self.assertEqual(decode_value(b"3", ValueType.intValueType, False), 3)
+        self.assertEqual(decode_value(b"3.0", ValueType.intValueType, False), 3)
+        with self.assertRaises(ValueError):
+            decode_value(b"3.5", ValueType.intValueType, False)
+
+    def test_str_and_bool(self):
+        self.assertEqual(decode_value(b'"abc"', ValueType.strValueType, False), "abc")
+        self.assertFalse(decode_value(b"false", ValueType.boolValueType, False))
+        self.assertTrue(decode_value(b"true", ValueType.boolValueType, False))
+
+
+if __name__ == '__main__':
+    unittest.main()